@@ -15,7 +15,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-# This script generates two files:
+# Usage: python build/compress.py [--jobs N] [--force] [--verbose]
+#     <game> [<game> ...]
+# or 'all' for every game.  Games are built in parallel, each in its own
+# process, and a game's output is printed together once it is done.
+# A game is skipped if the hashes of all its inputs (sources, externs,
+# compiler and message catalogue) match its last build; --verbose prints
+# why each game was rebuilt.
+# Which messages each game keeps, and why, is written to
+# build/cache/<game>-messages.txt.
+#
+# For each game, this script generates two files:
 #   compressed.js
 #   uncompressed.js
 # The compressed file is a concatenation of all the relevant JavaScript which
@@ -26,11 +36,21 @@
 # been renamed.  The uncompressed file also allows for a faster development
 # cycle since there is no need to rebuild or recompile, just reload.
 
+import argparse
+import concurrent.futures
+import contextlib
+import functools
+import glob
+import hashlib
+import io
 import json
+import multiprocessing
 import os.path
 import re
 import subprocess
 import sys
+import time
+import traceback
 
 
 if sys.version_info[0] < 3:
@@ -39,17 +59,62 @@ if sys.version_info[0] < 3:
 # Define a warning message for all the generated files.
 WARNING = '// Automatically generated file.  Do not edit!\n'
 
-blocklyMessageNames = []
-blocklyGamesMessageNames = []
+# Every game, in the order 'all' builds them.
+GAMES = ['index', 'puzzle', 'maze', 'bird', 'turtle', 'movie', 'music',
+         'pond/tutor', 'pond/duck', 'gallery']
+
+COMPILER = 'build/third-party-downloads/closure-compiler.jar'
+EXTERNS = [
+  'externs/interpreter-externs.js',
+  'externs/prettify-externs.js',
+  'externs/soundJS-externs.js',
+  'externs/storage-externs.js',
+  'externs/svg-externs.js',
+]
+# Hashes of each game's inputs at its last build.
+CACHE_DIR = 'build/cache/'
+
+# Every language's messages, parsed once and shared by every game.
+# See getCatalogue.
+catalogue = None
 
-def main(gameName):
+def main(gameName, force=False, verbose=False):
+  """Build one game, unless it is up to date.
+
+  Returns:
+    True if the game was built, False if it was skipped.
+  """
   print('Compressing %s' % gameName.title())
+  langs = getLanguages()
+  inputs = hashFiles(inputFiles(gameName), loadCache(gameName)['inputs'])
+  reasons = staleReasons(gameName, inputs, langs)
+  if not reasons and not force:
+    print('Up to date.\n')
+    return False
+  if verbose:
+    for reason in reasons or ['Forced.']:
+      print('Rebuilding: %s' % reason)
+  # Never leave an old cache describing half-written outputs.
+  saveCache(gameName, {})
   if not os.path.exists('server/html/%s/generated' % gameName):
     os.mkdir('server/html/%s/generated' % gameName)
   generate_uncompressed(gameName)
   generate_compressed(gameName)
-  filterMessages(gameName)
+  messageNames = filterMessages(gameName)
+
+  if not os.path.exists('server/html/%s/generated/msg' % gameName):
+    os.mkdir('server/html/%s/generated/msg' % gameName)
+  # Projecting the catalogue is cheap; overlap the writes.
+  with concurrent.futures.ThreadPoolExecutor() as executor:
+    list(executor.map(
+        functools.partial(language, gameName, messageNames=messageNames),
+        langs))
+  saveCache(gameName, inputs)
+  print("")
+  return True
 
+
+def getLanguages():
   # Extract the list of supported languages from boot.js.
   # This is a bit fragile.
   boot = open('server/html/common/boot.js', 'r')
@@ -60,37 +125,238 @@ def main(gameName):
     raise Exception("Can't find BlocklyGamesLanguages in boot.js")
   langs = m.group(1)
   langs = langs.replace("'", '"')
-  langs = json.loads(langs)
+  return json.loads(langs)
+
+
+def compilerInputs(gameName):
+  """Closure Compiler's --js globs for a game."""
+  inputs = [
+    'server/html/third-party/base.js',
+    'server/html/third-party/blockly/**.js',
+    'server/html/src/*.js',
+  ]
+  directory = gameName
+  while directory:
+    inputs.append('server/html/%s/src/*.js' % directory)
+    (directory, sep, fragment) = directory.rpartition(os.path.sep)
+  return inputs
+
+
+def inputFiles(gameName):
+  """Every file a game's outputs are built from, sorted."""
+  files = set([COMPILER, 'build/compress.py', 'server/html/common/boot.js'])
+  files.update(EXTERNS)
+  for pattern in compilerInputs(gameName):
+    # Closure's '**.js' matches in all subdirectories.
+    files.update(glob.glob(pattern.replace('**', '**/*'), recursive=True))
+  files.update(glob.glob('server/html/generated/msg/*.js'))
+  return sorted(files)
+
+
+def cacheName(gameName):
+  return CACHE_DIR + gameName.replace('/', '-') + '.json'
+
+
+def loadCache(gameName):
+  try:
+    with open(cacheName(gameName)) as f:
+      return json.load(f)
+  except (OSError, ValueError):
+    return {'inputs': {}}
+
+
+def saveCache(gameName, inputs):
+  os.makedirs(CACHE_DIR, exist_ok=True)
+  with open(cacheName(gameName) + '.tmp', 'w') as f:
+    json.dump({'inputs': inputs}, f, indent=0, sort_keys=True)
+  os.replace(cacheName(gameName) + '.tmp', cacheName(gameName))
+
+
+def hashFiles(files, cached):
+  """Hash files, reusing the cached hash of any file whose size and
+  modification time haven't changed.
+
+  Args:
+    files: List of file names.
+    cached: Dict of file name to [size, mtime, hash] from the last build.
+
+  Returns:
+    Dict of file name to [size, mtime, hash].
+  """
+  inputs = {}
+  for name in files:
+    stat = os.stat(name)
+    old = cached.get(name)
+    if old and old[:2] == [stat.st_size, stat.st_mtime_ns]:
+      inputs[name] = old
+    else:
+      with open(name, 'rb') as f:
+        digest = hashlib.sha1(f.read()).hexdigest()
+      inputs[name] = [stat.st_size, stat.st_mtime_ns, digest]
+  return inputs
+
+
+def staleReasons(gameName, inputs, langs):
+  """List the reasons a game needs to be rebuilt, if any."""
+  cached = loadCache(gameName)['inputs']
+  if not cached:
+    return ['No record of a previous build.']
+  reasons = []
+  for name in sorted(set(inputs) | set(cached)):
+    if name not in cached:
+      reasons.append('%s was added.' % name)
+    elif name not in inputs:
+      reasons.append('%s was removed.' % name)
+    elif inputs[name][2] != cached[name][2]:
+      reasons.append('%s changed.' % name)
+  outputs = ['server/html/%s/generated/%s' % (gameName, name)
+             for name in ('uncompressed.js', 'compressed.js')]
+  outputs.extend('server/html/%s/generated/msg/%s.js' % (gameName, lang)
+                 for lang in langs)
+  for name in outputs:
+    if not os.path.exists(name):
+      reasons.append('%s is missing.' % name)
+  return reasons
+
+
+def build(gameName, force=False, verbose=False):
+  """Build one game, capturing everything it prints.
+
+  Args:
+    gameName: Name of the game, e.g. 'pond/duck'.
+    force: Build even if the game is up to date.
+    verbose: Print the reasons for rebuilding.
+
+  Returns:
+    Tuple of the game's name, its status ('OK', 'SKIPPED' or 'FAILED'),
+    its output, and the seconds it took.
+  """
+  start = time.time()
+  output = io.StringIO()
+  with contextlib.redirect_stdout(output):
+    try:
+      status = 'OK' if main(gameName, force, verbose) else 'SKIPPED'
+    except Exception:
+      traceback.print_exc(file=output)
+      status = 'FAILED'
+  return (gameName, status, output.getvalue(), time.time() - start)
 
-  for lang in langs:
-    language(gameName, lang)
-  print("")
+
+def buildAll(gameNames, jobs, force=False, verbose=False):
+  """Build several games in a pool of processes and summarize the results.
+
+  Args:
+    gameNames: List of game names.
+    jobs: Number of games to build at once.
+    force: Build games even if they are up to date.
+    verbose: Print the reasons for rebuilding each game.
+
+  Returns:
+    True if no game failed.
+  """
+  start = time.time()
+  results = []
+  # Parse the messages before forking, so that every worker shares them.
+  try:
+    getCatalogue()
+  except Exception:
+    # E.g. the message files haven't been generated yet.  Each game then
+    # fails to load them itself, and is reported as failed in the summary.
+    pass
+  with multiprocessing.Pool(min(jobs, len(gameNames))) as pool:
+    for result in pool.imap_unordered(
+        functools.partial(build, force=force, verbose=verbose), gameNames):
+      print(result[2], end='')
+      sys.stdout.flush()
+      results.append(result)
+  print('Summary:')
+  for (gameName, status, output, seconds) in sorted(results):
+    print('  %-12s %-7s %6.1fs' % (gameName, status, seconds))
+  statuses = [result[1] for result in results]
+  print('Built %d, skipped %d, failed %d of %d games in %.1fs.' %
+        (statuses.count('OK'), statuses.count('SKIPPED'),
+         statuses.count('FAILED'), len(results), time.time() - start))
+  return 'FAILED' not in statuses
+
+
+# Names compiled code may use a message by, in one pass: quoted strings,
+# property accesses and %{BKY_...} references.
+REFERENCE_PATTERN = re.compile(
+    '(?<=["\'])([\\w.$-]+)(?=["\'])|\\.([A-Za-z_$][\\w$]*)|%\\{BKY_(\\w+)\\}')
+REFERENCE_KINDS = ('string', 'property', 'BKY reference')
+
+
+def findReferences(js):
+  """Tokenize compiled code into the names it refers to.
+
+  Args:
+    js: Compiled code.
+
+  Returns:
+    Dict of each kind in REFERENCE_KINDS to a set of names.
+  """
+  references = {kind: set() for kind in REFERENCE_KINDS}
+  for m in REFERENCE_PATTERN.finditer(js):
+    index = m.lastindex
+    references[REFERENCE_KINDS[index - 1]].add(m.group(index))
+  return references
 
 
 def filterMessages(gameName):
-  global blocklyMessageNames, blocklyGamesMessageNames
   # Identify all the Blockly messages used.
   # Load the compiled game.
   f = open('server/html/%s/generated/compressed.js' % gameName, 'r')
   js = f.read()
   f.close()
-  # Load any language file (they all should have the same keys).
-  msgs = getMessages('en')
-  for msg in msgs:
-    m = re.search('BlocklyMsg\\["([^"]+)"\\] = ', msg)
-    if m:
-      if (('"' + m.group(1) + '"') in js or
-          ('.' + m.group(1)) in js or
-          ('%{BKY_' + m.group(1) + '}') in js):
-        blocklyMessageNames.append(m.group(1))
-    m = re.search('BlocklyGamesMsg\\["([^"]+)"\\] = ', msg)
-    if m:
-      if ('"' + m.group(1) + '"') in js or ('.' + m.group(1)) in js:
-        blocklyGamesMessageNames.append(m.group(1))
+  references = findReferences(js)
+  # Any language has the same keys.
+  (blocklyMsgs, blocklyGamesMsgs) = getCatalogue()['en']
+  # Only Blockly messages can be %{BKY_...} references.
+  kinds = {'BlocklyMsg': REFERENCE_KINDS,
+           'BlocklyGamesMsg': ('string', 'property')}
+  report = []
+  blocklyMessageNames = set()
+  blocklyGamesMessageNames = set()
+  for (table, msgs, names) in (
+      ('BlocklyMsg', blocklyMsgs, blocklyMessageNames),
+      ('BlocklyGamesMsg', blocklyGamesMsgs, blocklyGamesMessageNames)):
+    for name in msgs:
+      reasons = [kind for kind in kinds[table] if name in references[kind]]
+      if reasons:
+        names.add(name)
+      report.append((table, name, reasons))
   print("Found %d Blockly messages." % len(blocklyMessageNames))
-  blocklyMessageNames.sort()
   print("Found %d Blockly Games messages." % len(blocklyGamesMessageNames))
-  blocklyGamesMessageNames.sort()
+  writeMessageReport(gameName, report)
+  return (blocklyMessageNames, blocklyGamesMessageNames)
+
+
+def writeMessageReport(gameName, report):
+  """Write which messages a game keeps, why, and what they cost.
+
+  Args:
+    gameName: Name of the game.
+    report: List of (table, message name, reasons kept) tuples.
+  """
+  # Bytes of each message summed over every language.
+  sizes = {}
+  for (blocklyMsgs, blocklyGamesMsgs) in getCatalogue().values():
+    for (table, msgs) in (('BlocklyMsg', blocklyMsgs),
+                          ('BlocklyGamesMsg', blocklyGamesMsgs)):
+      for (name, value) in msgs.items():
+        sizes[(table, name)] = sizes.get((table, name), 0) + len(value)
+  kept = [entry for entry in report if entry[2]]
+  print('Kept messages total %d KB over all languages.' %
+        (sum(sizes.get(entry[:2], 0) for entry in kept) / 1024))
+  os.makedirs(CACHE_DIR, exist_ok=True)
+  f = open(CACHE_DIR + gameName.replace('/', '-') + '-messages.txt', 'w')
+  f.write('# Messages of %s, largest first: bytes over all languages, '
+          'name, and why it was kept.\n' % gameName)
+  for (table, name, reasons) in sorted(report,
+      key=lambda entry: (not entry[2], -sizes.get(entry[:2], 0))):
+    f.write('%8d %s["%s"] %s\n' % (sizes.get((table, name), 0), table, name,
+            ', '.join(reasons) or 'DROPPED'))
+  f.close()
 
 
 def getMessages(lang):
@@ -102,24 +368,47 @@ def getMessages(lang):
   return msgs
 
 
-def language(gameName, lang):
-  global blocklyMessageNames, blocklyGamesMessageNames
-  msgs = getMessages(lang)
+def parseMessages(lang):
+  """Parse one language's message file.
+
+  Returns:
+    Tuple of the Blockly and the Blockly Games messages, each a dict of
+    message name to JavaScript value, in file order.
+  """
+  blocklyMsgs = {}
+  blocklyGamesMsgs = {}
+  for msg in getMessages(lang):
+    m = re.search('Blockly(Games)?Msg\\["([^"]+)"\\] = (.*);\\s*', msg)
+    if m:
+      msgs = blocklyGamesMsgs if m.group(1) else blocklyMsgs
+      msgs[m.group(2)] = m.group(3)
+  return (blocklyMsgs, blocklyGamesMsgs)
+
+
+def getCatalogue():
+  """Return the messages of every language, parsing them on first use.
+
+  Returns:
+    Dict of language to the tuple returned by parseMessages.
+  """
+  global catalogue
+  if catalogue is None:
+    catalogue = {lang: parseMessages(lang) for lang in getLanguages()}
+  return catalogue
+
+
+def language(gameName, lang, messageNames):
+  (blocklyMessageNames, blocklyGamesMessageNames) = messageNames
+  (blocklyMsgs, blocklyGamesMsgs) = getCatalogue()[lang]
   # Only write out messages that are used (as detected in filterMessages).
-  bMsgs = []
-  bgMsgs = []
-  for msg in msgs:
-    m = re.search('BlocklyMsg\\["([^"]+)"\\] = (.*);\\s*', msg)
-    if m and m.group(1) in blocklyMessageNames:
-      # Blockly message names are all alphabetic, no need to quote.
-      bMsgs.append('%s:%s' % (m.group(1), m.group(2)))
-    m = re.search('BlocklyGamesMsg\\["([^"]+)"\\] = (.*);\\s*', msg)
-    if m and m.group(1) in blocklyGamesMessageNames:
-      # Blockly Games message names contain dots, quotes required.
-      bgMsgs.append('"%s":%s' % (m.group(1), m.group(2)))
+  # Blockly message names are all alphabetic, no need to quote.
+  bMsgs = ['%s:%s' % (name, value) for (name, value) in blocklyMsgs.items()
+           if name in blocklyMessageNames]
+  # Blockly Games message names contain dots, quotes required.
+  bgMsgs = ['"%s":%s' % (name, value)
+            for (name, value) in blocklyGamesMsgs.items()
+            if name in blocklyGamesMessageNames]
 
-  if not os.path.exists('server/html/%s/generated/msg' % gameName):
-    os.mkdir('server/html/%s/generated/msg' % gameName)
   f = open('server/html/%s/generated/msg/%s.js' % (gameName, lang), 'w')
   f.write(WARNING)
   if bMsgs:
@@ -146,7 +435,8 @@ def generate_uncompressed(gameName):
       cmd.append('--root=%s' % subdir)
     (directory, sep, fragment) = directory.rpartition(os.path.sep)
   try:
-    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE)
   except:
     raise Exception("Failed to Popen: %s" % ' '.join(cmd))
   files = readStdout(proc)
@@ -192,29 +482,22 @@ window.CLOSURE_NO_DEPS = true;
 def generate_compressed(gameName):
   cmd = [
     'java',
-    '-jar', 'build/third-party-downloads/closure-compiler.jar',
+    '-jar', COMPILER,
     '--generate_exports',
     '--compilation_level', 'ADVANCED_OPTIMIZATIONS',
     '--dependency_mode=PRUNE',
-    '--externs', 'externs/interpreter-externs.js',
-    '--externs', 'externs/prettify-externs.js',
-    '--externs', 'externs/soundJS-externs.js',
-    '--externs', 'externs/storage-externs.js',
-    '--externs', 'externs/svg-externs.js',
     #'--language_in', 'STABLE',
     '--language_out', 'ECMASCRIPT5',
     '--entry_point=server/html/%s/src/main' % gameName,
-    "--js='server/html/third-party/base.js'",
-    "--js='server/html/third-party/blockly/**.js'",
-    "--js='server/html/src/*.js'",
     '--warning_level', 'QUIET',
   ]
-  directory = gameName
-  while directory:
-    cmd.append("--js='server/html/%s/src/*.js'" % directory)
-    (directory, sep, fragment) = directory.rpartition(os.path.sep)
+  for externs in EXTERNS:
+    cmd.extend(['--externs', externs])
+  for pattern in compilerInputs(gameName):
+    cmd.append("--js='%s'" % pattern)
   try:
-    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE)
   except:
     print("Failed to Popen: %s" % cmd)
     raise
@@ -251,16 +534,34 @@ def trim_licence(code):
 
 
 def readStdout(proc):
-  data = proc.stdout.readlines()
-  # Python 2 reads stdout as text.
-  # Python 3 reads stdout as bytes.
-  return list(map(lambda line:
-      type(line) == str and line or str(line, 'utf-8'), data))
+  """Wait for a process, and return its stdout as a list of lines.
+
+  The process's stderr is printed, so that it joins the rest of the game's
+  output.  Raises an exception if the process failed.
+  """
+  (data, errors) = proc.communicate()
+  errors = str(errors, 'utf-8')
+  if errors:
+    print(errors, end='')
+  if proc.returncode:
+    raise Exception('%s exited with status %d.' %
+                    (proc.args[0], proc.returncode))
+  return str(data, 'utf-8').splitlines(True)
 
 
 if __name__ == '__main__':
-  if len(sys.argv) == 2:
-    main(sys.argv[1])
-  else:
-    print('Format: %s <appname>' % sys.argv[0])
-    sys.exit(2)
+  parser = argparse.ArgumentParser(description='Compress games.')
+  parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1,
+                      help='Number of games to build at once.')
+  parser.add_argument('--force', action='store_true',
+                      help='Build games even if they are up to date.')
+  parser.add_argument('--verbose', action='store_true',
+                      help='Print why each game is rebuilt.')
+  parser.add_argument('games', nargs='+', metavar='game',
+                      help="Game to build (e.g. 'pond/duck'), or 'all'.")
+  args = parser.parse_args()
+  gameNames = []
+  for gameName in args.games:
+    gameNames.extend(GAMES if gameName == 'all' else [gameName])
+  if not buildAll(gameNames, args.jobs, args.force, args.verbose):
+    sys.exit(1)
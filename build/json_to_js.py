@@ -17,9 +17,10 @@
 # limitations under the License.
 
 import argparse
-import codecs
 import glob
+import hashlib
 import json
+import multiprocessing
 import os
 import re
 import sys
@@ -28,8 +29,20 @@ import sys
 if sys.version_info[0] < 3:
     raise Exception("Must be using Python 3")
 
+# Hashes of each language's inputs when its .js file was last generated.
+CACHE_FILE = os.path.join('build', 'cache', 'json_to_js.json')
+
+# Set in each worker by init_worker: the command-line arguments, and the
+# message data every language shares.
+args = None
+shared = None
+
 def main():
-  """Generate .js files defining Blockly Games messages."""
+  """Generate .js files defining Blockly Games messages.
+
+  Only languages whose inputs changed since the last run are regenerated,
+  in parallel.  Output files whose contents don't change aren't touched.
+  """
 
   # Process command-line arguments.
   parser = argparse.ArgumentParser(description='Convert JSON files to JS.')
@@ -45,6 +58,10 @@ def main():
   parser.add_argument('--output_dir',
                       default=os.path.join('server', 'html', 'generated', 'msg'),
                       help='Relative directory for output .js files.')
+  parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1,
+                      help='Number of languages to generate at once.')
+  parser.add_argument('--force', action='store_true',
+                      help='Regenerate every language.')
   args = parser.parse_args()
   if not args.blockly_msg_dir.endswith(os.path.sep):
     args.blockly_msg_dir += os.path.sep
@@ -54,11 +71,6 @@ def main():
     args.output_dir += os.path.sep
   os.makedirs(args.output_dir, exist_ok=True)
 
-  blockly_constants_data = read_json_file(args.blockly_msg_dir, 'constants')
-  blockly_synonyms_data = read_json_file(args.blockly_msg_dir, 'synonyms')
-  blockly_default_data = read_json_file(args.blockly_msg_dir, args.default_lang)
-  bg_default_data = read_json_file(args.blocklygames_msg_dir, args.default_lang)
-
   language_files = glob.glob(os.path.join(args.blocklygames_msg_dir, '*.json'))
   language_files.sort()
   languages = []
@@ -71,55 +83,144 @@ def main():
       continue
     languages.append(language)
 
-    output_file = codecs.open(os.path.join(args.output_dir, language + '.js'), 'w', 'utf-8')
-    output_file.write('''// This file was automatically generated.  Do not modify.
+  # Every language depends on these files, as well as on its own two.
+  common_hash = hash_files([
+    os.path.join(args.blockly_msg_dir, 'constants.json'),
+    os.path.join(args.blockly_msg_dir, 'synonyms.json'),
+    os.path.join(args.blockly_msg_dir, args.default_lang + '.json'),
+    os.path.join(args.blocklygames_msg_dir, args.default_lang + '.json'),
+    __file__,
+  ])
+  cache = load_cache()
+  keys = {}
+  stale = []
+  for language in languages:
+    keys[language] = hash_files([
+      os.path.join(args.blockly_msg_dir, language + '.json'),
+      os.path.join(args.blocklygames_msg_dir, language + '.json'),
+    ], common_hash)
+    if (args.force or cache.get(language) != keys[language] or
+        not os.path.exists(os.path.join(args.output_dir, language + '.js'))):
+      stale.append(language)
+
+  written = []
+  if stale:
+    shared = {
+      'constants': read_json_file(args.blockly_msg_dir, 'constants'),
+      'synonyms': read_json_file(args.blockly_msg_dir, 'synonyms'),
+      'blockly_default': read_json_file(args.blockly_msg_dir, args.default_lang),
+      'bg_default': read_json_file(args.blocklygames_msg_dir, args.default_lang),
+    }
+    with multiprocessing.Pool(min(args.jobs, len(stale)), init_worker,
+                              (args, shared)) as pool:
+      for (language, changed) in pool.imap_unordered(generate, stale):
+        cache[language] = keys[language]
+        if changed:
+          written.append(language)
+    save_cache(cache)
+
+  print('Generated message js files for: ' + str(sorted(written)))
+  print('%d of %d languages unchanged.' %
+        (len(languages) - len(written), len(languages)))
+
+
+def hash_files(file_names, seed=''):
+  """Return a hash of the contents of some files, and of an optional seed."""
+  hasher = hashlib.sha1(seed.encode('utf-8'))
+  for file_name in file_names:
+    with open(file_name, 'rb') as f:
+      hasher.update(hashlib.sha1(f.read()).digest())
+  return hasher.hexdigest()
+
+
+def load_cache():
+  try:
+    with open(CACHE_FILE) as f:
+      return json.load(f)
+  except (OSError, ValueError):
+    return {}
+
+
+def save_cache(cache):
+  os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
+  with open(CACHE_FILE + '.tmp', 'w') as f:
+    json.dump(cache, f, indent=0, sort_keys=True)
+  os.replace(CACHE_FILE + '.tmp', CACHE_FILE)
+
+
+def init_worker(worker_args, worker_shared):
+  global args, shared
+  args = worker_args
+  shared = worker_shared
+
+
+def generate(language):
+  """Generate one language's .js file, in a worker.
+
+  The file is replaced atomically, and only if its contents changed, so that
+  an unchanged file keeps its modification time.
+
+  Returns:
+    Tuple of the language and whether its file was written.
+  """
+  lines = ["""// This file was automatically generated.  Do not modify.
 
 'use strict';
 var BlocklyMsg = {};
 var BlocklyGamesMsg = {};
 
-''')
-
-    # Write the Blockly messages.
-    blockly_language_data = read_json_file(args.blockly_msg_dir, language)
-    blockly_msg_dict = {}
-    for (name, default_message) in blockly_default_data.items():
-      if name in blockly_language_data:
-        message_str = blockly_language_data[name]
-        comment = ''
-      else:
-        message_str = default_message
-        comment = '  // untranslated'
-      message_str = scrub_message(message_str)
-      blockly_msg_dict[name] = message_str
-      output_file.write('BlocklyMsg["%s"] = "%s";%s\n' % (name, message_str, comment))
-    output_file.write('\n')
-    for (name, alias_name) in blockly_synonyms_data.items():
-      blockly_msg_dict[name] = blockly_msg_dict[alias_name]
-      output_file.write('BlocklyMsg["%s"] = "%s";\n' % (name, blockly_msg_dict[alias_name]))
-    output_file.write('\n')
-    for (name, message_str) in blockly_constants_data.items():
-      message_str = scrub_message(message_str)
-      blockly_msg_dict[name] = message_str
-      output_file.write('BlocklyMsg["%s"] = "%s";\n' % (name, message_str))
-
-    output_file.write('\n')
-
-    # Write the Blockly Games messages.
-    bg_language_data = read_json_file(args.blocklygames_msg_dir, language)
-    for (name, default_message) in bg_default_data.items():
-      if name in bg_language_data:
-        message_str = bg_language_data[name]
-        comment = ''
-      else:
-        message_str = default_message
-        comment = '  // untranslated'
-      message_str = scrub_message(message_str)
-      output_file.write('BlocklyGamesMsg["%s"] = "%s";%s\n' % (name, message_str, comment))
-
-    output_file.close()
-
-  print('Generated message js files for: ' + str(languages))
+"""]
+
+  # Write the Blockly messages.
+  blockly_language_data = read_json_file(args.blockly_msg_dir, language)
+  blockly_msg_dict = {}
+  for (name, default_message) in shared['blockly_default'].items():
+    if name in blockly_language_data:
+      message_str = blockly_language_data[name]
+      comment = ''
+    else:
+      message_str = default_message
+      comment = '  // untranslated'
+    message_str = scrub_message(message_str)
+    blockly_msg_dict[name] = message_str
+    lines.append('BlocklyMsg["%s"] = "%s";%s\n' % (name, message_str, comment))
+  lines.append('\n')
+  for (name, alias_name) in shared['synonyms'].items():
+    blockly_msg_dict[name] = blockly_msg_dict[alias_name]
+    lines.append('BlocklyMsg["%s"] = "%s";\n' % (name, blockly_msg_dict[alias_name]))
+  lines.append('\n')
+  for (name, message_str) in shared['constants'].items():
+    message_str = scrub_message(message_str)
+    blockly_msg_dict[name] = message_str
+    lines.append('BlocklyMsg["%s"] = "%s";\n' % (name, message_str))
+
+  lines.append('\n')
+
+  # Write the Blockly Games messages.
+  bg_language_data = read_json_file(args.blocklygames_msg_dir, language)
+  for (name, default_message) in shared['bg_default'].items():
+    if name in bg_language_data:
+      message_str = bg_language_data[name]
+      comment = ''
+    else:
+      message_str = default_message
+      comment = '  // untranslated'
+    message_str = scrub_message(message_str)
+    lines.append('BlocklyGamesMsg["%s"] = "%s";%s\n' % (name, message_str, comment))
+
+  data = ''.join(lines).encode('utf-8')
+  file_name = os.path.join(args.output_dir, language + '.js')
+  try:
+    with open(file_name, 'rb') as f:
+      if f.read() == data:
+        return (language, False)
+  except FileNotFoundError:
+    pass
+  temp_name = '%s.%d.tmp' % (file_name, os.getpid())
+  with open(temp_name, 'wb') as f:
+    f.write(data)
+  os.replace(temp_name, file_name)
+  return (language, True)
 
 
 def scrub_message(msg):
@@ -131,9 +232,8 @@ def scrub_message(msg):
 
 
 def read_json_file(dir, isoCode):
-  json_file = codecs.open(os.path.join(dir, isoCode + '.json'), 'r', 'utf-8')
-  data = json.load(json_file)
-  json_file.close()
+  with open(os.path.join(dir, isoCode + '.json'), 'r', encoding='utf-8') as json_file:
+    data = json.load(json_file)
   if '@metadata' in data:
     del data['@metadata']
   return data
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""Blockly Games: Access Index
+
+Copyright 2026 Google LLC
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""Record the last day each stored program was fetched, from nginx's logs.
+The data volume is mounted noatime, so a program's atime doesn't say when it
+was last loaded.  Instead, every hit on /data/<app>/storage/<key>.blockly in
+/bg-logs/access.log (and its rotated and gzipped predecessors) is folded into
+an SQLite index of (app, key) -> day number, which expiry.py reads.
+Logs are streamed, and each one is read from where the last update stopped,
+so updating is cheap however large the logs grow.  Run from the command line
+(expiry.py also updates the index before each sweep):
+  nice python access_index.py [--log /bg-logs/access.log]
+"""
+
+__author__ = "blocklygames@neil.fraser.name (Neil Fraser)"
+
+import argparse
+import cgi_utils
+import datetime
+import glob
+import gzip
+import hashlib
+import os
+import re
+import sqlite3
+import time
+
+
+LOG_PATH = "/bg-logs/access.log"
+# Commit progress after this many lines, so an interrupted update loses
+# little work.
+BATCH_LINES = 1000000
+# Keys per lookup, under SQLite's limit on query parameters.
+MAX_KEYS = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS access (
+  app TEXT NOT NULL,
+  key TEXT NOT NULL,
+  day INTEGER NOT NULL,
+  PRIMARY KEY (app, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS logs (
+  signature TEXT PRIMARY KEY,
+  offset INTEGER NOT NULL,
+  complete INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+  name TEXT PRIMARY KEY,
+  value INTEGER NOT NULL
+);
+"""
+
+# A successful program fetch in nginx's combined log format, e.g.
+# 1.2.3.4 - - [18/Oct/2026:18:10:19 +0000] "GET /data/turtle/storage/
+# abcdef.blockly HTTP/1.1" 200 ...
+HIT_PATTERN = re.compile(rb'\[(\d\d/\w\w\w/\d{4}):[^\]]*\] '
+    rb'"(?:GET|HEAD) /data/([-\w]+)/storage/(\w+)\.blockly[ ?][^"]*" '
+    rb'(?:200|304) ')
+MONTHS = {name: number + 1 for (number, name) in enumerate((b"Jan", b"Feb",
+    b"Mar", b"Apr", b"May", b"Jun", b"Jul", b"Aug", b"Sep", b"Oct", b"Nov",
+    b"Dec"))}
+EPOCH = datetime.date(1970, 1, 1)
+
+
+def get_index_name():
+  return cgi_utils.DATA_PATH + "/access.sqlite"
+
+
+def today():
+  return int(time.time() // (60 * 60 * 24))
+
+
+def connect():
+  db = sqlite3.connect(get_index_name(), timeout=10)
+  db.execute("PRAGMA journal_mode=WAL")
+  db.executescript(SCHEMA)
+  return db
+
+
+def open_log(file_name):
+  if file_name.endswith(".gz"):
+    return gzip.open(file_name, "rb")
+  return open(file_name, "rb")
+
+
+# Identify a log by its first line, which survives rotation and compression.
+# Returns None until the first line is complete.
+def signature(file_name):
+  with open_log(file_name) as f:
+    line = f.readline()
+  if not line.endswith(b"\n"):
+    return None
+  return hashlib.sha1(line).hexdigest()
+
+
+# Convert "18/Oct/2026" to a day number.
+def parse_day(text):
+  (day, month, year) = text.split(b"/")
+  return (datetime.date(int(year), MONTHS[month], int(day)) - EPOCH).days
+
+
+def save(db, hits, sig, offset, complete):
+  with db:
+    db.executemany("INSERT INTO access VALUES (?, ?, ?) "
+                   "ON CONFLICT (app, key) DO UPDATE "
+                   "SET day = max(day, excluded.day)",
+                   ((app, key, day) for ((app, key), day) in hits.items()))
+    db.execute("INSERT OR REPLACE INTO logs VALUES (?, ?, ?)",
+               (sig, offset, complete))
+
+
+# Fold the unread part of one log into the index.  Returns lines read.
+def read_log(db, file_name):
+  sig = signature(file_name)
+  if not sig:
+    return 0
+  row = db.execute("SELECT offset, complete FROM logs WHERE signature = ?",
+                   (sig,)).fetchone()
+  (offset, complete) = row or (0, False)
+  if complete:
+    return 0
+  # Gzipped logs are never written to again.
+  compressed = file_name.endswith(".gz")
+  hits = {}
+  days = {}
+  count = 0
+  with open_log(file_name) as f:
+    # Seeking a gzipped log decompresses everything before the offset.
+    f.seek(offset)
+    for line in f:
+      if not line.endswith(b"\n"):
+        # nginx is still writing this line.
+        break
+      offset += len(line)
+      count += 1
+      if b"/storage/" in line:
+        m = HIT_PATTERN.search(line)
+        if m:
+          if m[1] not in days:
+            days[m[1]] = parse_day(m[1])
+          hit = (m[2].decode(), m[3].decode())
+          hits[hit] = max(hits.get(hit, 0), days[m[1]])
+      if count % BATCH_LINES == 0:
+        save(db, hits, sig, offset, False)
+        hits = {}
+  save(db, hits, sig, offset, compressed)
+  return count
+
+
+# Bring the index up to date with every log.  Returns lines read.
+def update(log_path=LOG_PATH):
+  db = connect()
+  with db:
+    db.execute("INSERT OR IGNORE INTO meta VALUES ('since', ?)", (today(),))
+  count = 0
+  # Oldest first, though the order only matters to an interrupted update.
+  for file_name in sorted(glob.glob(log_path + "*"), key=os.path.getmtime):
+    count += read_log(db, file_name)
+  db.close()
+  return count
+
+
+# Day number on which the index started recording, or None if it hasn't.
+# Programs fetched before then aren't in it.
+def since():
+  if not os.path.exists(get_index_name()):
+    return None
+  db = connect()
+  row = db.execute("SELECT value FROM meta WHERE name = 'since'").fetchone()
+  db.close()
+  return row and row[0]
+
+
+# Return a dict of key -> day last fetched, for those of an app's 'keys' that
+# have been fetched.  Callers pass a batch of keys at a time, so that no app's
+# whole index has to be held in memory.
+def last_days(app, keys):
+  keys = list(keys)
+  if not keys or not os.path.exists(get_index_name()):
+    return {}
+  db = connect()
+  days = {}
+  for start in range(0, len(keys), MAX_KEYS):
+    chunk = keys[start:start + MAX_KEYS]
+    days.update(db.execute("SELECT key, day FROM access WHERE app = ? "
+                           "AND key IN (%s)" % ",".join("?" * len(chunk)),
+                           [app] + chunk))
+  db.close()
+  return days
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Index program fetches.")
+  parser.add_argument("--log", default=LOG_PATH,
+                      help="Live access log; rotated copies are found too.")
+  args = parser.parse_args()
+  start = time.time()
+  count = update(args.log)
+  print("Read %d log line(s) in %.1f seconds." % (count, time.time() - start))
+
+
+if __name__ == "__main__":
+  main()
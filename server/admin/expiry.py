@@ -16,50 +16,243 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
-"""Delete any record not accessed in a while.
-Can be executed from the web, or from the command line.
+"""Delete any stored program not accessed in a while.
+The data volume is mounted noatime, so the last access of each program comes
+from the index access_index.py builds from nginx's logs, which is updated
+before each sweep.  Until that index is AGE old, atimes are honoured too.
+Programs in a gallery never expire.  Progress is checkpointed after every
+directory, so an interrupted sweep resumes where it stopped.  Run from the
+command line, in the background:
+  nohup nice python expiry.py [--dry-run] [--rate DELETES_PER_SECOND]
+      [--restart] [app ...] &
+Requested from the web, it starts such a sweep (or reports on the one already
+running) instead of sweeping inside the request.
 """
 
 __author__ = "blocklygames@neil.fraser.name (Neil Fraser)"
 
+import access_index
+import argparse
+import cgi_utils
+import fcntl
+import itertools
+import json
 import os
+import re
+import subprocess
+import sys
 import time
 
 
-# Data directory.
-PATH = "../data/"
 # Two years.
 AGE = 60*60*24*365*2
+DAY = 60*60*24
+# Deletes per second of sweeps started from the web.
+WEB_RATE = 50
+STATS = ("scanned", "gallery", "expired", "bytes")
+# Number of programs whose last fetch is looked up at once.
+LOOKUP_BATCH = 500
 
 
-EXPIRY = int(time.time()) - AGE
+def get_expiry_dir():
+  return cgi_utils.DATA_PATH + "/expiry/"
+
+
+# Keys of an app's gallery records, whose programs must be kept.
+def gallery_keys(app):
+  return {os.path.basename(name)[:-len(".gallery")]
+          for name in cgi_utils.glob_files(app, "gallery", ".gallery")}
+
+
+# Directories holding an app's files of a type, as (name, path) pairs in
+# sweep order.  The flat directory, with files shard_migrate.py hasn't moved
+# yet, is named "".
+def shard_dirs(app, type):
+  dir = cgi_utils.get_dir(app, type)
+  with os.scandir(dir) as entries:
+    shards = sorted(entry.name for entry in entries
+                    if entry.is_dir(follow_symlinks=False) and
+                    re.fullmatch(r"\w\w", entry.name))
+  return [("", dir)] + [(name, dir + name + "/") for name in shards]
+
+
+# Return the stat of a program's directory entry if it hasn't been accessed
+# since state["cutoff"], else None.  'accessed' maps keys to the day they were
+# last fetched.
+def expired(entry, key, accessed, state):
+  if (accessed.get(key, -1) + 1) * DAY > state["cutoff"]:
+    return None
+  stat = entry.stat(follow_symlinks=False)
+  # A program that was never fetched is as old as its file.
+  last = stat.st_mtime
+  if state["atime"]:
+    last = max(last, stat.st_atime)
+  return stat if last < state["cutoff"] else None
 
-# Print HTTP header if this is a web request.
-if "REQUEST_METHOD" in os.environ:
-  print("Content-Type: text/plain")
-  print("Status: 200 OK\n")
 
-dir_count = 0
-for root, dir_names, file_names in os.walk(PATH):
-  dir_count += 1
-  print("Scanning %s" % root)
-  delete_count = 0
-  for name in file_names:
-    if not name.endswith(".blockly"):
-      # Only delete Blockly files.
+# Yield (entry, stat) for each of an app's expired programs among (key, entry)
+# pairs.  Their last fetches are looked up in the access index a batch at a
+# time.
+def find_expired(app, candidates, state):
+  candidates = iter(candidates)
+  while True:
+    batch = list(itertools.islice(candidates, LOOKUP_BATCH))
+    if not batch:
+      return
+    accessed = access_index.last_days(app, [key for (key, entry) in batch])
+    for (key, entry) in batch:
+      stat = expired(entry, key, accessed, state)
+      if stat:
+        yield (entry, stat)
+
+
+# Yield (key, entry) for the programs of a directory that aren't kept, adding
+# to 'stats'.  Directory entries already say which names are files.
+def candidates(entries, keep, stats):
+  for entry in entries:
+    # Only delete Blockly files, whether or not they have been compressed.
+    (key, ext) = (entry.name.split(".", 1) + [""])[:2]
+    if (ext not in ("blockly", "blockly.gz") or
+        not entry.is_file(follow_symlinks=False)):
       continue
-    full_name = root + "/" + name
-    if os.path.exists(full_name[:-len(".blockly")] + ".gallery"):
-      # Don't delete Blockly files that match to a gallery entry.
+    stats["scanned"] += 1
+    if key in keep:
+      stats["gallery"] += 1
       continue
-    when = os.path.getatime(full_name)
-    if when < EXPIRY:
-      os.remove(full_name)
-      delete_count += 1
-  if delete_count > 0:
-    print("Deleted %d file(s)." % delete_count)
-
-if dir_count == 0:
-  print('Data directories not found.  PATH not valid?')
-else:
-  print("Done.")
+    yield (key, entry)
+
+
+# Sweep one directory, adding to 'stats'.  Only candidate programs are stat'ed.
+def sweep_dir(app, path, keep, state, args, stats):
+  with os.scandir(path) as entries:
+    for (entry, stat) in find_expired(app, candidates(entries, keep, stats),
+                                      state):
+      stats["expired"] += 1
+      stats["bytes"] += stat.st_size
+      if not args.dry_run:
+        os.remove(entry.path)
+        if args.rate:
+          time.sleep(1 / args.rate)
+
+
+def load_state(file_name):
+  try:
+    with open(file_name) as f:
+      return json.load(f)
+  except (FileNotFoundError, ValueError):
+    return None
+
+
+def save_state(file_name, state):
+  with open(file_name + ".tmp", "w") as f:
+    json.dump(state, f)
+  os.replace(file_name + ".tmp", file_name)
+
+
+def print_summary(state, dry_run):
+  verb = "would delete" if dry_run else "deleted"
+  for (app, stats) in sorted(state["stats"].items()):
+    print("%s: scanned %d, kept %d in gallery, %s %d (%d KB)." %
+          (app, stats["scanned"], stats["gallery"], verb, stats["expired"],
+           stats["bytes"] / 1024))
+  if state["finished"]:
+    print("Finished %s." % time.ctime(state["finished"]))
+  elif state["position"]:
+    print("In progress, at %s/storage/%s." % tuple(state["position"]))
+
+
+# Start a sweep: bring the access index up to date and pick the cutoff.
+def new_state():
+  access_index.update()
+  since = access_index.since()
+  return {
+    "started": time.time(),
+    "cutoff": time.time() - AGE,
+    # Fetches from before the index started aren't in it.
+    "atime": since is None or since * DAY > time.time() - AGE,
+    "position": None,
+    "finished": None,
+    "stats": {}
+  }
+
+
+def sweep(args):
+  dir = get_expiry_dir()
+  os.makedirs(dir, exist_ok=True)
+  state_name = dir + ("dry-run.json" if args.dry_run else "state.json")
+  with open(dir + "lock", "a") as lock:
+    try:
+      fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+      print("Another sweep is already running.")
+      return
+    state = load_state(state_name)
+    if args.restart or not state or state["finished"]:
+      state = new_state()
+    else:
+      print("Resuming the sweep started %s." % time.ctime(state["started"]))
+
+    for app in sorted(args.apps or cgi_utils.get_apps("storage")):
+      stats = state["stats"].setdefault(app, dict.fromkeys(STATS, 0))
+      keep = None
+      for (name, path) in shard_dirs(app, "storage"):
+        if state["position"] and [app, name] <= state["position"]:
+          # Swept before the last interruption.
+          continue
+        if keep is None:
+          keep = gallery_keys(app)
+        sweep_dir(app, path, keep, state, args, stats)
+        state["position"] = [app, name]
+        save_state(state_name, state)
+    state["finished"] = time.time()
+    save_state(state_name, state)
+  print_summary(state, args.dry_run)
+
+
+# Handle a web request: start a sweep in the background unless one is
+# already running, and report progress so far.
+def web_request():
+  print("Content-Type: text/plain")
+  print("Status: 200 OK\n")
+  dir = get_expiry_dir()
+  os.makedirs(dir, exist_ok=True)
+  with open(dir + "lock", "a") as lock:
+    try:
+      fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+      running = False
+    except BlockingIOError:
+      running = True
+  if running:
+    print("A sweep is already running.")
+  else:
+    # Without REQUEST_METHOD, the child sweeps rather than answering a request.
+    env = dict(os.environ)
+    del env["REQUEST_METHOD"]
+    with open(dir + "expiry.log", "a") as log:
+      subprocess.Popen(["nice", sys.executable, os.path.abspath(__file__),
+                        "--rate", str(WEB_RATE)],
+                       env=env, stdin=subprocess.DEVNULL, stdout=log,
+                       stderr=subprocess.STDOUT, start_new_session=True)
+    print("Started a sweep in the background.")
+  state = load_state(dir + "state.json")
+  if state:
+    print_summary(state, False)
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Delete old stored programs.")
+  parser.add_argument("--dry-run", action="store_true",
+                      help="Count what would be deleted, but don't delete.")
+  parser.add_argument("--rate", type=float, default=0,
+                      help="Maximum deletes per second (0 for unlimited).")
+  parser.add_argument("--restart", action="store_true",
+                      help="Start over instead of resuming a stopped sweep.")
+  parser.add_argument("apps", nargs="*", help="Apps to sweep (default all).")
+  sweep(parser.parse_args())
+
+
+if __name__ == "__main__":
+  if "REQUEST_METHOD" in os.environ:
+    web_request()
+  else:
+    main()
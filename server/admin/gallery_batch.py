@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""Blockly Games: Gallery Admin Batch Moderation
+
+Copyright 2026 Google LLC
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""Publish, unpublish or delete many gallery records in one request.
+"""
+
+__author__ = "blocklygames@neil.fraser.name (Neil Fraser)"
+
+import cgi_utils
+import gallery_moderation
+import json
+
+# Called with one argument:
+# - ops: JSON list of {"app": ..., "key": ..., "action": ...} objects, where
+#   action is publish/unpublish/delete.
+# Returns a JSON list with the result of each operation, in order.
+
+
+forms = cgi_utils.parse_post()
+cgi_utils.force_exist(forms, "ops")
+
+print("Content-Type: text/plain")
+try:
+  operations = [(op["app"], op["key"], op["action"])
+                for op in json.loads(forms["ops"] or "")]
+except (ValueError, TypeError, KeyError):
+  operations = None
+if operations is None or not all(isinstance(value, str)
+    for operation in operations for value in operation):
+  print("Status: 406 Not Acceptable\n")
+  print("Ops must be a JSON list of {app, key, action} objects.")
+else:
+  messages = gallery_moderation.apply(operations)
+  print("Status: 200 OK\n")
+  print(json.dumps([{
+    "app": app,
+    "key": key,
+    "action": action,
+    "result": message
+  } for ((app, key, action), message) in zip(operations, messages)]))
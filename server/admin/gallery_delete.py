@@ -22,7 +22,7 @@ limitations under the License.
 __author__ = "blocklygames@neil.fraser.name (Neil Fraser)"
 
 import cgi_utils
-import os
+import gallery_moderation
 import re
 
 # Called with two arguments:
@@ -46,10 +46,4 @@ elif key and not re.match(r"\w+", key):
   print("That is not a valid key.")
 else:
   print("Status: 200 OK\n")
-  dir = cgi_utils.get_dir(app)
-  file_name = dir + key + ".gallery"
-  if os.path.exists(file_name):
-    os.remove(file_name)
-    print("Deleted")
-  else:
-    print("Record not found")
+  print(gallery_moderation.apply([(app, key, "delete")])[0])
@@ -0,0 +1 @@
+../scripts/gallery_index.py
\ No newline at end of file
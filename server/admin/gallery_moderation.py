@@ -0,0 +1,105 @@
+"""Blockly Games: Gallery Moderation
+
+Copyright 2026 Google LLC
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""Publish, unpublish and delete gallery records.
+Shared by gallery_publish.py, gallery_delete.py and gallery_batch.py.
+"""
+
+__author__ = "blocklygames@neil.fraser.name (Neil Fraser)"
+
+import cgi_utils
+import gallery_index
+import gallery_pages
+import json
+import os
+import re
+
+
+ACTIONS = ("publish", "unpublish", "delete")
+
+
+# Set a record's public flag and mark it as reviewed.
+# Returns (message, new state), with a state of False if nothing changed.
+def set_public(app, key, public):
+  file_name = cgi_utils.find_path(app, "gallery", key, ".gallery")
+  if not os.path.exists(file_name):
+    return ("Record not found.", False)
+  with open(file_name) as f:
+    datum = json.load(f)
+  text = "true" if public else "false"
+  if datum["public"] == public and datum.get("reviewed"):
+    return ("Public was already " + text, False)
+  datum["public"] = public
+  datum["reviewed"] = True
+  # Replace the record atomically, so that no reader sees it half-written.
+  temp_name = "%s.%d.tmp" % (file_name, os.getpid())
+  with open(temp_name, "w") as f:
+    json.dump(datum, f)
+  os.replace(temp_name, file_name)
+  return ("Public = " + text, gallery_index.record_state(datum))
+
+
+# Delete a record and its thumbnails.  Returns (message, new state), with a
+# state of None if the record was deleted or False if nothing changed.
+def delete(app, key):
+  file_name = cgi_utils.find_path(app, "gallery", key, ".gallery")
+  if not os.path.exists(file_name):
+    return ("Record not found", False)
+  os.remove(file_name)
+  for ext in (".png",) + gallery_index.THUMB_VARIANTS:
+    file_name = cgi_utils.find_path(app, "gallery", key, ext)
+    if os.path.exists(file_name):
+      os.remove(file_name)
+  return ("Deleted", None)
+
+
+# Apply a list of (app, key, action) operations.  The index of each app is
+# updated in a single transaction and its static pages are regenerated once.
+# Returns one message per operation.
+def apply(operations):
+  messages = []
+  changes = {}
+  for (app, key, action) in operations:
+    if not re.fullmatch(r"[-\w]+", app):
+      # Don't scan "../../etc/passwd".
+      messages.append("That is not a valid directory.")
+      continue
+    if not re.fullmatch(r"\w+", key):
+      # Don't escape from this directory.
+      messages.append("That is not a valid key.")
+      continue
+    try:
+      if action == "delete":
+        (message, state) = delete(app, key)
+      elif action in ACTIONS:
+        (message, state) = set_public(app, key, action == "publish")
+      else:
+        message = "Action must be one of: " + ", ".join(ACTIONS)
+        state = False
+    except (OSError, ValueError, KeyError) as e:
+      # A corrupt record mustn't stop the rest of the batch, nor the index
+      # update for the operations already done.
+      message = "Failed: %r" % e
+      state = False
+    messages.append(message)
+    if state is not False:
+      changes.setdefault(app, {})[key] = state
+
+  for (app, app_changes) in changes.items():
+    created = gallery_index.update(app, app_changes)
+    gallery_pages.materialize(app, created)
+  return messages
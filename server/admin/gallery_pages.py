@@ -0,0 +1 @@
+../scripts/gallery_pages.py
\ No newline at end of file
@@ -16,14 +16,14 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
-"""Set a gallery record to be either public or private.
+"""Set a gallery record to be either public or hidden.
+Either way the record leaves the moderation queue.
 """
 
 __author__ = "blocklygames@neil.fraser.name (Neil Fraser)"
 
 import cgi_utils
-import json
-import os
+import gallery_moderation
 import re
 
 # Called with three arguments:
@@ -52,21 +52,6 @@ elif public != "true" and public != "false":
   print("Status: 406 Not Acceptable\n")
   print("Public must be 'true' or 'false'.")
 else:
-  new_public = public == "true"
-  dir = cgi_utils.get_dir(app)
-  file_name = dir + key + ".gallery"
+  action = "publish" if public == "true" else "unpublish"
   print("Status: 200 OK\n")
-  if os.path.exists(file_name):
-    with open(file_name) as f:
-      datum = json.load(f)
-    if datum['public'] == new_public:
-      print("Public was already " + public)
-    else:
-      datum['public'] = new_public
-      with open(file_name, "w") as f:
-        json.dump(datum, f)
-      print("Public = " + public)
-  else:
-    print("Record not found.")
-
-  print(json.dumps(data))
+  print(gallery_moderation.apply([(app, key, action)])[0])
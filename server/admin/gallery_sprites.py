@@ -0,0 +1 @@
+../scripts/gallery_sprites.py
\ No newline at end of file
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Blockly Games: Gallery Thumbnail Migration
+
+Copyright 2026 Google LLC
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""Remove inline base64 thumbnails from existing .gallery records.
+Thumbnails are served from the separate .png files instead.  If a record's
+.png is missing it is first recreated from the inline copy.
+Run from the command line:
+  python gallery_strip_thumbs.py [app ...]
+"""
+
+__author__ = "blocklygames@neil.fraser.name (Neil Fraser)"
+
+import base64
+import cgi_utils
+import json
+import os
+import sys
+
+
+THUMB_PREFIX = "data:image/png;base64,"
+
+
+# Strip one record.  Returns the number of bytes saved.
+def strip(file_name):
+  with open(file_name) as f:
+    try:
+      datum = json.load(f)
+    except ValueError:
+      print("Skipping invalid JSON: %s" % file_name)
+      return 0
+  thumb = datum.pop("thumb", None)
+  if thumb is None:
+    return 0
+  png_name = file_name[:-len(".gallery")] + ".png"
+  if not os.path.exists(png_name) and thumb.startswith(THUMB_PREFIX):
+    with open(png_name, "wb") as f:
+      f.write(base64.standard_b64decode(thumb[len(THUMB_PREFIX):]))
+  old_size = os.path.getsize(file_name)
+  temp_name = file_name + ".tmp"
+  with open(temp_name, "w") as f:
+    json.dump(datum, f)
+  os.replace(temp_name, file_name)
+  return old_size - os.path.getsize(file_name)
+
+
+if __name__ == "__main__":
+  for app in sys.argv[1:] or cgi_utils.get_apps("gallery"):
+    count = 0
+    saved = 0
+    for file_name in cgi_utils.glob_files(app, "gallery", ".gallery"):
+      record_saved = strip(file_name)
+      if record_saved:
+        count += 1
+        saved += record_saved
+    print("%s: stripped %d record(s), saved %d KB." %
+          (app, count, saved / 1024))
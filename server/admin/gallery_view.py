@@ -16,20 +16,21 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
-"""Fetch both public and private gallery records.
+"""Fetch gallery records in any moderation state.
 """
 
 __author__ = "blocklygames@neil.fraser.name (Neil Fraser)"
 
 import cgi_utils
+import gallery_index
 import json
-import glob
-import os
 import re
+import sys
 
-# Called with two arguments:
+# Called with three arguments:
 # - app: turtle/movie/music
-# - cursor: Key to the next page of results.
+# - cursor: Cursor to the next or previous page of results.
+# - state: pending/public/hidden, or empty for all records.
 # Returns a JSON object.
 
 # Number of rows per page.
@@ -38,9 +39,10 @@ ROWS_PAGE = 240
 
 if __name__ == "__main__":
   forms = cgi_utils.parse_query()
-  cgi_utils.force_exist(forms, "app", "cursor")
+  cgi_utils.force_exist(forms, "app", "cursor", "state")
   app = forms["app"] or ""
   cursor = forms["cursor"] or ""
+  state = forms["state"] or None
 
   print("Content-Type: text/plain")
   if not re.match(r"[-\w]+", app):
@@ -51,34 +53,18 @@ if __name__ == "__main__":
     # Don't escape from this directory
     print("Status: 406 Not Acceptable\n")
     print("That is not a valid cursor.")
+  elif state and state not in gallery_index.STATES:
+    print("Status: 406 Not Acceptable\n")
+    print("State must be one of: " + ", ".join(gallery_index.STATES))
   else:
-    dir = cgi_utils.get_dir(app)
-    names = sorted(glob.glob("%s*.gallery" % dir), key=os.path.getctime)
-
-    # Trim off all entries before the cursor.
-    if cursor:
-      cursor_name = "/%s.gallery" % cursor
-      cursor_index = [i for i, name in enumerate(names) if name.endswith(cursor_name)]
-      if len(cursor_index):
-        names = names[cursor_index[0]:]
-      else:
-        # Can't find the cursor.
-        names = []
-    data = [];
-    for name in names:
-      m = re.search(r"/(\w+)\.gallery$", name)
-      if not m:
-        continue
-      if len(data) >= ROWS_PAGE:
-        # Last entry is the cursor for the next chunk.
-        data.append({"cursor": m[1]})
-        break
-      with open(name) as f:
-        try:
-          datum = json.load(f)
-        except:
-          datum = {"title": "Invalid JSON"}
-      datum["key"] = m[1]
-      data.append(datum)
+    try:
+      (data, next_cursor, previous_cursor) = gallery_index.page(
+          app, cursor, ROWS_PAGE, state)
+    except ValueError:
+      print("Status: 406 Not Acceptable\n")
+      print("That is not a valid cursor.")
+      sys.exit()
+    # Last entry holds the cursors for the next and previous chunks.
+    gallery_index.add_cursors(data, next_cursor, previous_cursor)
     print("Status: 200 OK\n")
     print(json.dumps(data))
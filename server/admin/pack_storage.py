@@ -0,0 +1 @@
+../scripts/pack_storage.py
\ No newline at end of file
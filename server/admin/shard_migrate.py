@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Blockly Games: Shard Migration
+
+Copyright 2026 Google LLC
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""Move programs and gallery files from the flat storage/ and gallery/
+directories into the sharded layout (storage/ab/abcdef.blockly.gz).
+Safe to run while the site is up: each file is hard linked into its shard
+before the flat copy is removed, so it can always be found by nginx and by
+cgi_utils.find_path.  Run from the command line in the background:
+  nice python shard_migrate.py [--rate FILES_PER_SECOND] [app ...]
+"""
+
+__author__ = "blocklygames@neil.fraser.name (Neil Fraser)"
+
+import argparse
+import cgi_utils
+import os
+import re
+import time
+
+
+# Files that belong in a shard.  Anything else (e.g. the gallery index) stays.
+FILE_PATTERN = re.compile(r"(\w{2,})(\.blockly|\.blockly\.gz|\.gallery|\.png)")
+
+
+# Move one file into its shard.  Returns False if the name isn't sharded.
+def migrate(app, type, name):
+  m = FILE_PATTERN.fullmatch(name)
+  if not m:
+    return False
+  flat_path = cgi_utils.get_dir(app, type) + name
+  try:
+    os.link(flat_path, cgi_utils.make_path(app, type, m[1], m[2]))
+  except FileExistsError:
+    # A newer copy was already written into the shard.
+    pass
+  os.remove(flat_path)
+  return True
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Shard stored files.")
+  parser.add_argument("--rate", type=float, default=0,
+                      help="Maximum files per second (0 for unlimited).")
+  parser.add_argument("apps", nargs="*", help="Apps to migrate (default all).")
+  args = parser.parse_args()
+
+  for type in ("storage", "gallery"):
+    for app in args.apps or cgi_utils.get_apps(type):
+      dir = cgi_utils.get_dir(app, type)
+      if not os.path.isdir(dir):
+        continue
+      count = 0
+      with os.scandir(dir) as entries:
+        for entry in entries:
+          if entry.is_file() and migrate(app, type, entry.name):
+            count += 1
+            if args.rate:
+              time.sleep(1 / args.rate)
+      print("%s/%s: moved %d file(s)." % (app, type, count))
+
+
+if __name__ == "__main__":
+  main()
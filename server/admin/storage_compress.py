@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Blockly Games: Storage Compressor
+
+Copyright 2026 Google LLC
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""Convert existing .blockly programs to the .blockly.gz files that
+storage.store now writes.  Safe to run while the site is up, and to stop and
+restart at any time.  Run from the command line in the background:
+  nice python storage_compress.py [--rate FILES_PER_SECOND] [app ...]
+"""
+
+__author__ = "blocklygames@neil.fraser.name (Neil Fraser)"
+
+import argparse
+import cgi_utils
+import gzip
+import os
+import time
+
+
+# Compress one file in place.  Returns the number of bytes saved.
+def compress(file_name):
+  gz_name = file_name + ".gz"
+  if os.path.exists(gz_name):
+    # A newer save has already written the compressed copy.
+    saved = os.path.getsize(file_name)
+    os.remove(file_name)
+    return saved
+  with open(file_name, "rb") as f:
+    data = f.read()
+  stat = os.stat(file_name)
+  temp_name = gz_name + ".tmp"
+  with open(temp_name, "wb") as f:
+    f.write(gzip.compress(data, mtime=0))
+  # Keep the timestamps that expiry.py relies on.
+  os.utime(temp_name, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+  os.replace(temp_name, gz_name)
+  os.remove(file_name)
+  return stat.st_size - os.path.getsize(gz_name)
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Compress stored programs.")
+  parser.add_argument("--rate", type=float, default=0,
+                      help="Maximum files per second (0 for unlimited).")
+  parser.add_argument("apps", nargs="*", help="Apps to convert (default all).")
+  args = parser.parse_args()
+
+  for app in args.apps or cgi_utils.get_apps("storage"):
+    count = 0
+    saved = 0
+    for file_name in cgi_utils.glob_files(app, "storage", ".blockly"):
+      saved += compress(file_name)
+      count += 1
+      if args.rate:
+        time.sleep(1 / args.rate)
+    print("%s: compressed %d file(s), saved %d KB." %
+          (app, count, saved / 1024))
+
+
+if __name__ == "__main__":
+  main()
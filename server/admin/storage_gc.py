@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""Blockly Games: Storage Garbage Collection
+
+Copyright 2026 Google LLC
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""Delete stored files that nothing references any more.
+Marks the live keys of each app, then sweeps:
+- thumbnails (.png, .grid.png, .grid.webp) with no gallery record,
+- gallery records whose program is gone,
+- programs that are in no gallery and have expired (see expiry.py),
+- temporary files left behind by interrupted writes.
+Files younger than GRACE are never touched, since their other half may still
+be on its way (e.g. in the write journal).  Apps are collected in parallel.
+Run from the command line:
+  nice python storage_gc.py [--dry-run] [--workers N] [app ...]
+"""
+
+__author__ = "blocklygames@neil.fraser.name (Neil Fraser)"
+
+import argparse
+import cgi_utils
+import expiry
+import gallery_index
+import gallery_pages
+import multiprocessing
+import os
+import pack_storage
+import time
+
+
+# One day.
+GRACE = 60*60*24
+KINDS = ("thumbnails", "records", "programs", "temporary files")
+THUMB_EXTS = (".png",) + gallery_index.THUMB_VARIANTS
+PROGRAM_EXTS = (".blockly", ".blockly.gz")
+
+
+# Yield the files of an app's type as (key, extension, entry) triples.
+def scan(app, type):
+  if not os.path.isdir(cgi_utils.get_dir(app, type)):
+    return
+  for (name, path) in expiry.shard_dirs(app, type):
+    with os.scandir(path) as entries:
+      for entry in entries:
+        if entry.is_file(follow_symlinks=False):
+          (key, dot, ext) = entry.name.partition(".")
+          yield (key, dot + ext, entry)
+
+
+# Keys of an app's packed programs.
+def packed_keys(app):
+  if not os.path.exists(pack_storage.get_pack_dir(app) + "index.sqlite"):
+    return set()
+  db = pack_storage.connect(app)
+  try:
+    return {row[0] for row in db.execute("SELECT key FROM records")}
+  finally:
+    db.close()
+
+
+# Collect one app's garbage.  Returns (app, stats), where stats maps each
+# kind of file to (files deleted, bytes reclaimed).
+def collect(job):
+  (app, state, dry_run) = job
+  stats = {kind: [0, 0] for kind in KINDS}
+  young = time.time() - GRACE
+
+  def remove(kind, entry, stat=None):
+    stat = stat or entry.stat(follow_symlinks=False)
+    if stat.st_mtime >= young:
+      return False
+    stats[kind][0] += 1
+    stats[kind][1] += stat.st_size
+    if not dry_run:
+      os.remove(entry.path)
+    return True
+
+  # Mark.
+  programs = packed_keys(app)
+  records = set()
+  for (key, ext, entry) in scan(app, "storage"):
+    if ext in PROGRAM_EXTS:
+      programs.add(key)
+  for (key, ext, entry) in scan(app, "gallery"):
+    if ext == ".gallery":
+      records.add(key)
+
+  # Sweep the gallery.  Records go first, so that their thumbnails follow.
+  removed = {}
+  for (key, ext, entry) in scan(app, "gallery"):
+    if ext == ".gallery" and key not in programs:
+      if remove("records", entry):
+        removed[key] = None
+  records.difference_update(removed)
+  for (key, ext, entry) in scan(app, "gallery"):
+    if ext in THUMB_EXTS and key not in records:
+      remove("thumbnails", entry)
+    elif ext.endswith(".tmp"):
+      remove("temporary files", entry)
+  if removed and not dry_run:
+    created = gallery_index.update(app, removed)
+    gallery_pages.materialize(app, created)
+
+  # Sweep the programs.
+  def candidates():
+    for (key, ext, entry) in scan(app, "storage"):
+      if ext in PROGRAM_EXTS and key not in records:
+        yield (key, entry)
+      elif ext.endswith(".tmp"):
+        remove("temporary files", entry)
+  for (entry, stat) in expiry.find_expired(app, candidates(), state):
+    remove("programs", entry, stat)
+  return (app, stats)
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Delete unreferenced files.")
+  parser.add_argument("--dry-run", action="store_true",
+                      help="Count what would be deleted, but don't delete.")
+  parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                      help="Number of apps to collect at once.")
+  parser.add_argument("apps", nargs="*", help="Apps to collect (default all).")
+  args = parser.parse_args()
+
+  state = expiry.new_state()
+  apps = args.apps or sorted(set(cgi_utils.get_apps("storage") +
+                                 cgi_utils.get_apps("gallery")))
+  verb = "Would reclaim" if args.dry_run else "Reclaimed"
+  total = 0
+  with multiprocessing.Pool(args.workers) as pool:
+    for (app, stats) in pool.imap(collect,
+                                  [(app, state, args.dry_run) for app in apps]):
+      print("%s: %s." % (app, ", ".join("%d %s (%d KB)" %
+            (stats[kind][0], kind, stats[kind][1] / 1024) for kind in KINDS)))
+      total += sum(size for (count, size) in stats.values())
+  print("%s %d KB." % (verb, total / 1024))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""Blockly Games: Write Journal Benchmark
+
+Copyright 2026 Google LLC
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""Compare saves/sec of storage.store writing each program's file directly
+against appending it to the write journal (storage.JOURNAL), from several
+processes at once.  Also times flushing the journal afterwards.
+Direct writes are measured both as storage.py does them, without fsync, and
+made as durable as a journaled save, with the file and its directory synced.
+Uses a throwaway data directory, never /bg-data.  Put it on the disk being
+measured with --dir, since fsync costs nothing on tmpfs.
+"""
+
+__author__ = "blocklygames@neil.fraser.name (Neil Fraser)"
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+
+SCRIPTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "..", "scripts")
+
+
+def make_program(n):
+  return '<xml><block type="turtle_move"><field name="VALUE">%d</field>' \
+         '</block></xml>' % n
+
+
+# Save programs [start, stop) from one process, in one of MODES.
+def save_range(data_path, mode, start, stop):
+  os.environ["BG_DATA_PATH"] = data_path
+  sys.path.insert(0, SCRIPTS_PATH)
+  import journal
+  import storage
+  storage.JOURNAL = mode == "journal"
+  if mode == "durable":
+    write = storage.write
+
+    def durable_write(app, key, compressed_data):
+      paths = write(app, key, compressed_data)
+      for path in paths:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+          os.fsync(fd)
+        finally:
+          os.close(fd)
+        journal.fsync_dir(os.path.dirname(path))
+      return paths
+
+    storage.write = durable_write
+  for n in range(start, stop):
+    storage.store("turtle", make_program(n))
+
+
+def measure(name, data_path, mode, offset, requests, processes):
+  per_process = requests // processes
+  workers = [multiprocessing.Process(target=save_range,
+      args=(data_path, mode, offset + i * per_process,
+            offset + (i + 1) * per_process)) for i in range(processes)]
+  start = time.perf_counter()
+  for worker in workers:
+    worker.start()
+  for worker in workers:
+    worker.join()
+  elapsed = time.perf_counter() - start
+  total = per_process * processes
+  print("%-16s %6d saves in %6.2fs = %8.1f saves/s" %
+        (name, total, elapsed, total / elapsed))
+  return total / elapsed
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Benchmark the write journal.")
+  parser.add_argument("--requests", type=int, default=2000)
+  parser.add_argument("--processes", type=int, default=8)
+  parser.add_argument("--dir", help="Directory to create the test data in.")
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory(dir=args.dir) as data_path:
+    os.makedirs(os.path.join(data_path, "turtle", "storage"))
+    # Offset each run's programs, so that none just finds existing files.
+    measure("direct", data_path, "direct", 0, args.requests, args.processes)
+    durable_rate = measure("direct + fsync", data_path, "durable",
+                           args.requests, args.requests, args.processes)
+    journal_rate = measure("journal", data_path, "journal", 2 * args.requests,
+                           args.requests, args.processes)
+
+    os.environ["BG_DATA_PATH"] = data_path
+    sys.path.insert(0, SCRIPTS_PATH)
+    import journal
+    import journal_flush
+    start = time.perf_counter()
+    count = journal.flush(journal_flush.apply)
+    print("Flushed %d record(s) in %.2fs." %
+          (count, time.perf_counter() - start))
+  print("Speedup over durable direct writes: %.1fx" %
+        (journal_rate / durable_rate))
+
+
+if __name__ == "__main__":
+  main()
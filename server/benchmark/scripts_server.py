@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Blockly Games: Script Server Benchmark
+
+Copyright 2026 Google LLC
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""Compare requests/sec of storage.py run once per request (as fcgiwrap does)
+against the same handler hosted by app_server.py.
+Uses a throwaway data directory, never /bg-data.
+"""
+
+__author__ = "blocklygames@neil.fraser.name (Neil Fraser)"
+
+import argparse
+import concurrent.futures
+import http.client
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import quote
+
+
+SCRIPTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "..", "scripts")
+
+
+def make_body(n):
+  xml = '<xml><block type="turtle_move"><field name="VALUE">%d</field>' \
+        '</block></xml>' % n
+  return ("app=turtle&data=" + quote(xml)).encode("utf-8")
+
+
+def run_cgi(env, n):
+  body = make_body(n)
+  cgi_env = dict(env, REQUEST_METHOD="POST", CONTENT_LENGTH=str(len(body)),
+                 CONTENT_TYPE="application/x-www-form-urlencoded")
+  proc = subprocess.run([sys.executable, "storage.py"], cwd=SCRIPTS_PATH,
+                        env=cgi_env, input=body, capture_output=True)
+  if b"200 OK" not in proc.stdout:
+    raise Exception("CGI request failed: %s" % proc.stdout + proc.stderr)
+
+
+def run_http(port, n):
+  body = make_body(n)
+  conn = http.client.HTTPConnection("127.0.0.1", port)
+  conn.request("POST", "/scripts/storage.py", body,
+               {"Content-Type": "application/x-www-form-urlencoded"})
+  response = conn.getresponse()
+  response.read()
+  conn.close()
+  if response.status != 200:
+    raise Exception("HTTP request failed: %d" % response.status)
+
+
+def measure(name, func, requests, concurrency):
+  start = time.perf_counter()
+  with concurrent.futures.ThreadPoolExecutor(concurrency) as pool:
+    list(pool.map(func, range(requests)))
+  elapsed = time.perf_counter() - start
+  print("%-16s %6d requests in %6.2fs = %8.1f req/s" %
+        (name, requests, elapsed, requests / elapsed))
+  return requests / elapsed
+
+
+def wait_for_port(port):
+  for i in range(100):
+    try:
+      socket.create_connection(("127.0.0.1", port)).close()
+      return
+    except OSError:
+      time.sleep(0.05)
+  raise Exception("Server did not start on port %d" % port)
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Benchmark the script server.")
+  parser.add_argument("--requests", type=int, default=500)
+  parser.add_argument("--concurrency", type=int, default=8)
+  parser.add_argument("--workers", type=int, default=8)
+  parser.add_argument("--port", type=int, default=18008)
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as data_path:
+    os.makedirs(os.path.join(data_path, "turtle", "storage"))
+    env = dict(os.environ, BG_DATA_PATH=data_path)
+
+    cgi_rate = measure("fork-per-request",
+        lambda n: run_cgi(env, n), args.requests, args.concurrency)
+
+    server = subprocess.Popen([sys.executable, "app_server.py",
+                               "--port", str(args.port),
+                               "--workers", str(args.workers)],
+                              cwd=SCRIPTS_PATH, env=env,
+                              stdout=subprocess.DEVNULL)
+    try:
+      wait_for_port(args.port)
+      # Offset the payloads so the server doesn't just rewrite the CGI files.
+      server_rate = measure("app_server",
+          lambda n: run_http(args.port, n + args.requests),
+          args.requests, args.concurrency)
+    finally:
+      server.terminate()
+      server.wait()
+  print("Speedup: %.1fx" % (server_rate / cgi_rate))
+
+
+if __name__ == "__main__":
+  main()
@@ -16,6 +16,13 @@ goog.require('BlocklyGames');
 goog.require('BlocklyGames.html');
 
 
+/**
+ * Transparent 1x1 image, shown over a sprite sheet background.
+ * @const {string}
+ */
+Gallery.html.BLANK =
+    'data:image/gif;base64,R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7';
+
 /**
  * Web page structure.
  * @param {!Object} ij Injected options.
@@ -37,14 +44,30 @@ ${BlocklyGames.html.headerBar(ij, appName, '', false, false, '')}
  * One record.
  * @param {string} app Application this record belongs to (turtle/movie/music)
  * @param {string} key Unique datastore key for the code (stored separately).
- * @param {string} thumb Base 64-encoded thumbnail.
+ * @param {string} thumb URL of thumbnail.
  * @param {string} title User-provided title.
+ * @param {Object=} sprite Optional position of the thumbnail in the page's
+ *     sprite sheet.
  * @returns {string} HTML.
  */
-Gallery.html.record = function(app, key, thumb, title) {
+Gallery.html.record = function(app, key, thumb, title, sprite) {
+  let img = `<img src="${thumb}">`;
+  if (sprite) {
+    // Show this record's cell of the sheet.  Percentages keep the cell
+    // aligned as the image is resized.
+    const size = sprite['size'];
+    const percent = (offset, total) =>
+        total > size ? offset / (total - size) * 100 : 0;
+    img = `<img src="${Gallery.html.BLANK}" style="` +
+        `background-image: url(${sprite['url']}); ` +
+        `background-size: ${sprite['width'] / size * 100}% ` +
+        `${sprite['height'] / size * 100}%; ` +
+        `background-position: ${percent(sprite['x'], sprite['width'])}% ` +
+        `${percent(sprite['y'], sprite['height'])}%">`;
+  }
   return `
 <div class="galleryThumb">
-  <a href="/${app}?level=10#${key}"><img src="${thumb}"></a>
+  <a href="/${app}?level=10#${key}">${img}</a>
 </div>
 <div class="galleryTitle">
   <a href="/${app}?level=10#${key}">${title}</a>
@@ -94,14 +94,12 @@ function receiveMore() {
   const data = JSON.parse(this.responseText);
   if (data.length) {
     const lastDatum = data[data.length - 1];
-    if (lastDatum['cursor']) {
-      // There are more records on the server.
-      cursor = lastDatum['cursor'];
+    if (!lastDatum['key']) {
+      // The last entry holds the cursors to the next and previous pages.
       data.pop();
-    } else {
-      // This was the last page of records.
-      cursor = null;
     }
+    // Null if this was the last page of records.
+    cursor = lastDatum['cursor'] || null;
     data.forEach(display);
   } else {
     // No more records.
@@ -116,7 +114,7 @@ function receiveMore() {
 function display(record) {
   const block = document.createElement('div');
   block.innerHTML = Gallery.html.record(app, record['key'],
-      record['thumb'], record['title']);
+      record['thumb'], record['title'], record['sprite']);
   BlocklyGames.getElementById('gallery').appendChild(block);
 }
 
@@ -152,36 +152,73 @@ BlocklyGames.IS_HTML = /\.html$/.test(window.location.pathname);
 BlocklyGames.getElementById = document.getElementById.bind(document);
 
 /**
- * Report client-side errors back to the server.
+ * Report client-side errors back to the server.  Errors are queued and sent
+ * in batches, at most once every 10 seconds.
  * @param {!ErrorEvent} event Error event.
  * @private
  */
 BlocklyGames.errorReporter_ = function(event) {
   try {
-    //if (Math.random() > 0.5) return;
     // 3rd party script errors (likely plugins) have no useful info.
     if (!event.lineno && !event.colno) return;
-    // Rate-limit the reports to once every 10 seconds.
-    const now = Date.now();
-    if (BlocklyGames.errorReporter_.lastHit_ + 10 * 1000 > now) return;
-    BlocklyGames.errorReporter_.lastHit_ = now;
-    const req = new XMLHttpRequest();
+    const reporter = BlocklyGames.errorReporter_;
+    // The server asked us to back off.
+    if (reporter.backoffUntil_ > Date.now()) return;
     // Try to use the experimental 'event.error.stack',
     // otherwise, use standard properties.
-    const report = (event.error?.stack) ||
-        `${event.message} ${event.filename} ${event.lineno}:${event.colno}`;
-    const params = "error=" + encodeURIComponent(report.trim()) +
-        '&url=' + encodeURIComponent(window.location);
-    req.open('POST', '/scripts/errorReporter.py');
-    req.setRequestHeader('Content-Type', 'application/x-www-form-urlencoded');
-    req.send(params);
-    console.log('Error reported.');
+    const report = ((event.error?.stack) ||
+        `${event.message} ${event.filename} ${event.lineno}:${event.colno}`)
+        .trim().substring(0, reporter.MAX_SIZE_);
+    // An error in a render loop fires every frame; queue it once.
+    if (reporter.queue_.includes(report)) return;
+    const size = reporter.queue_.reduce((total, r) => total + r.length, 0);
+    if (reporter.queue_.length >= reporter.MAX_BATCH_ ||
+        size + report.length > reporter.MAX_SIZE_) {
+      return;
+    }
+    reporter.queue_.push(report);
+    if (!reporter.timer_) {
+      const wait = Math.max(0, reporter.lastHit_ + 10 * 1000 - Date.now());
+      reporter.timer_ = setTimeout(BlocklyGames.sendErrors_, wait);
+    }
   } catch(e) {
     // Error in error reporter.  Do NOT recursively call the error reporter.
     console.log(event.error);
   }
 };
 BlocklyGames.errorReporter_.lastHit_ = 0;
+BlocklyGames.errorReporter_.backoffUntil_ = 0;
+BlocklyGames.errorReporter_.timer_ = 0;
+/** @type {!Array<string>} */
+BlocklyGames.errorReporter_.queue_ = [];
+// Limits of errorReporter.py, leaving room for the URL.
+BlocklyGames.errorReporter_.MAX_BATCH_ = 10;
+BlocklyGames.errorReporter_.MAX_SIZE_ = 8000;
+
+/**
+ * Send the queued error reports in one request.
+ * @private
+ */
+BlocklyGames.sendErrors_ = function() {
+  const reporter = BlocklyGames.errorReporter_;
+  reporter.timer_ = 0;
+  reporter.lastHit_ = Date.now();
+  const params = reporter.queue_.map((r) => 'error=' + encodeURIComponent(r));
+  params.push('url=' + encodeURIComponent(window.location));
+  reporter.queue_ = [];
+  const req = new XMLHttpRequest();
+  req.onload = function() {
+    // Sent when the server is overloaded or we sent too much.
+    const retryAfter = parseInt(req.getResponseHeader('Retry-After'), 10);
+    if (retryAfter) {
+      reporter.backoffUntil_ = Date.now() + retryAfter * 1000;
+    }
+  };
+  req.open('POST', '/scripts/errorReporter.py');
+  req.setRequestHeader('Content-Type', 'application/x-www-form-urlencoded');
+  req.send(params.join('&'));
+  console.log('Error reported.');
+};
 if (!BlocklyGames.IS_HTML) {
   window.addEventListener('error', BlocklyGames.errorReporter_);
 }
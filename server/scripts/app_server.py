@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""Blockly Games: Application Server
+
+Copyright 2026 Google LLC
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""Serve the /scripts endpoints from a pool of long-running processes.
+Each CGI script is imported once, then its main() is called for every request
+with the CGI environment, stdin and stdout pointed at the HTTP request.
+The scripts themselves remain directly executable under fcgiwrap.
+"""
+
+__author__ = "blocklygames@neil.fraser.name (Neil Fraser)"
+
+import argparse
+import contextlib
+import io
+import os
+import signal
+import sys
+import traceback
+from wsgiref.simple_server import make_server, WSGIRequestHandler
+
+import errorReporter
+import gallery_submit
+import gallery_view
+import storage
+import storage_load
+
+
+# URL path -> handler.  Paths match those nginx forwards to fcgiwrap.
+ROUTES = {
+  "/scripts/errorReporter.py": errorReporter.main,
+  "/scripts/gallery_submit.py": gallery_submit.main,
+  "/scripts/gallery_view.py": gallery_view.main,
+  "/scripts/storage.py": storage.main,
+  "/scripts/storage_load.py": storage_load.main,
+}
+
+# Request variables copied into os.environ for the duration of a request.
+CGI_VARIABLES = ("REQUEST_METHOD", "QUERY_STRING", "CONTENT_LENGTH",
+                 "CONTENT_TYPE", "REMOTE_ADDR", "HTTP_USER_AGENT")
+
+
+# Run one CGI-style handler and return its (status, headers, body).
+def run_handler(handler, environ):
+  cgi_environ = {name: environ.get(name) or "" for name in CGI_VARIABLES}
+  # Behind nginx the peer is always localhost.
+  if environ.get("HTTP_X_REAL_IP"):
+    cgi_environ["REMOTE_ADDR"] = environ["HTTP_X_REAL_IP"]
+
+  saved_environ = {name: os.environ.get(name) for name in CGI_VARIABLES}
+  saved_stdin = sys.stdin
+  output = io.StringIO()
+  os.environ.update(cgi_environ)
+  # The handler reads at most CONTENT_LENGTH bytes, and may reject the
+  # request before reading any.
+  sys.stdin = io.TextIOWrapper(environ["wsgi.input"], encoding="utf-8")
+  try:
+    with contextlib.redirect_stdout(output):
+      handler()
+  except Exception:
+    traceback.print_exc()
+    return ("500 Internal Server Error", [("Content-Type", "text/plain")],
+            b"Internal server error.\n")
+  finally:
+    # Don't let the wrapper close the request stream.
+    sys.stdin.detach()
+    sys.stdin = saved_stdin
+    for name, value in saved_environ.items():
+      if value is None:
+        os.environ.pop(name, None)
+      else:
+        os.environ[name] = value
+  return parse_cgi_output(output.getvalue())
+
+
+# Split a CGI response into a status line, a list of headers and a body.
+def parse_cgi_output(text):
+  (head, sep, body) = text.partition("\n\n")
+  if not sep:
+    # No header block at all.
+    (head, body) = ("", text)
+  status = "200 OK"
+  headers = []
+  for line in head.split("\n"):
+    (name, sep, value) = line.partition(":")
+    if not sep:
+      continue
+    if name.strip().lower() == "status":
+      status = value.strip()
+    else:
+      headers.append((name.strip(), value.strip()))
+  return (status, headers, body.encode("utf-8"))
+
+
+def application(environ, start_response):
+  handler = ROUTES.get(environ.get("PATH_INFO", ""))
+  if handler:
+    (status, headers, body) = run_handler(handler, environ)
+  else:
+    (status, headers, body) = ("404 Not Found",
+        [("Content-Type", "text/plain")], b"Not found.\n")
+  headers.append(("Content-Length", str(len(body))))
+  start_response(status, headers)
+  return [body]
+
+
+class QuietHandler(WSGIRequestHandler):
+  # nginx already logs every request.
+  def log_message(self, format, *args):
+    pass
+
+
+# Fork a worker that serves requests from the shared listening socket.
+def spawn_worker(httpd):
+  pid = os.fork()
+  if pid == 0:
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    try:
+      httpd.serve_forever()
+    finally:
+      os._exit(0)
+  return pid
+
+
+def serve(host, port, workers):
+  httpd = make_server(host, port, application, handler_class=QuietHandler)
+  print("Serving /scripts on %s:%d with %d workers." % (host, port, workers))
+  sys.stdout.flush()
+  children = set()
+  stopping = False
+
+  def stop(signum, frame):
+    nonlocal stopping
+    stopping = True
+    for pid in children:
+      os.kill(pid, signal.SIGTERM)
+  signal.signal(signal.SIGTERM, stop)
+  signal.signal(signal.SIGINT, stop)
+
+  for i in range(workers):
+    children.add(spawn_worker(httpd))
+  # Replace any worker that dies until asked to stop.
+  while children:
+    try:
+      (pid, status) = os.wait()
+    except ChildProcessError:
+      break
+    except InterruptedError:
+      continue
+    children.discard(pid)
+    if not stopping:
+      children.add(spawn_worker(httpd))
+  httpd.server_close()
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Serve the /scripts endpoints.")
+  parser.add_argument("--host", default="127.0.0.1",
+                      help="Interface to listen on.")
+  parser.add_argument("--port", type=int, default=8008,
+                      help="Port to listen on.")
+  parser.add_argument("--workers", type=int, default=os.cpu_count() or 4,
+                      help="Number of worker processes.")
+  args = parser.parse_args()
+  serve(args.host, args.port, args.workers)
@@ -20,13 +20,37 @@ limitations under the License.
 
 __author__ = "blocklygames@neil.fraser.name (Neil Fraser)"
 
+import codecs
+import glob
+import itertools
+import os
+import re
+import sys
 from os import environ
-from urllib.parse import unquote
-from sys import stdin
+from urllib.parse import unquote_to_bytes
 
 
-# Relative from both /scripts and /admin
-DATA_PATH = "/bg-data"
+# Absolute path of the data drive.  May be overridden for testing.
+DATA_PATH = environ.get("BG_DATA_PATH", "/bg-data")
+
+# Largest POST body accepted by default from requests without field limits.
+MAX_POST = 4000000
+# Most bytes one character can take percent-encoded (e.g. "%F0%9F%98%80").
+ENCODED_CHAR = 12
+# Room for the field names, separators and short unlimited fields of a
+# request with field limits.
+POST_SLACK = 64 * 1024
+# Longest accepted field name.
+MAX_NAME = 100
+# Bytes read from stdin at a time.
+CHUNK_SIZE = 64 * 1024
+# End of a field name.
+_NAME_END = re.compile(rb"[=&]")
+
+
+# Raised when a request, or one of its fields, is larger than allowed.
+class PayloadTooLarge(Exception):
+  pass
 
 
 # Return a data path for the given app and type.
@@ -35,27 +59,159 @@ def get_dir(app, type):
   return "%s/%s/%s/" % (DATA_PATH, app, type)
 
 
-# Parse POST data (e.g. a=1&b=2) into a dictionary (e.g. {"a": 1, "b": 2}).
-# Very minimal parser.  Does not combine repeated names (a=1&a=2), ignores
-# valueless names (a&b), does not support isindex or multipart/form-data.
-def parse_post():
-  return _parse(stdin.read())
+# Return the path of a key's file.  Files are fanned out into subdirectories
+# named after the first two characters of their key.
+# E.g. get_path("turtle", "storage", "abcdef", ".blockly.gz") ->
+#     "/bg-data/turtle/storage/ab/abcdef.blockly.gz"
+def get_path(app, type, key, ext):
+  return "%s%s/%s%s" % (get_dir(app, type), key[:2], key, ext)
 
 
-# Parse a query string (e.g. a=1&b=2) into a dictionary (e.g. {"a": 1, "b": 2}).
-# Very minimal parser.  Does not combine repeated names (a=1&a=2), ignores
-# valueless names (a&b), does not support isindex.
-def parse_query():
-  return _parse(environ["QUERY_STRING"])
+# Return the path of a key's existing file, which may still be in the flat
+# directory used before sharding.  Returns the sharded path if neither exists.
+def find_path(app, type, key, ext):
+  path = get_path(app, type, key, ext)
+  if not os.path.exists(path):
+    flat_path = get_dir(app, type) + key + ext
+    if os.path.exists(flat_path):
+      return flat_path
+  return path
+
+
+# Create the shard directory for a key's file and return the file's path.
+def make_path(app, type, key, ext):
+  path = get_path(app, type, key, ext)
+  os.makedirs(os.path.dirname(path), exist_ok=True)
+  return path
+
 
+# Iterate over the paths of all of an app's files with the given extension,
+# in both the sharded and the flat layout.
+def glob_files(app, type, ext):
+  dir = get_dir(app, type)
+  return itertools.chain(glob.iglob(dir + "??/*" + ext),
+                         glob.iglob(dir + "*" + ext))
 
-def _parse(data):
-  parts = data.split("&")
+
+# Return the names of all apps that have a data directory of the given type.
+# E.g. get_apps("gallery") -> ["movie", "music", "turtle"]
+def get_apps(type):
+  return sorted(os.path.basename(os.path.dirname(dir[:-1]))
+                for dir in glob.glob(get_dir("*", type)))
+
+
+# Parse POST data (e.g. a=1&b=2) into a dictionary (e.g. {"a": 1, "b": 2}).
+# The body is read and decoded in chunks, never more than CONTENT_LENGTH.
+# Raises PayloadTooLarge before reading anything if CONTENT_LENGTH exceeds
+# max_length, or as soon as a field exceeds its entry (in characters) in the
+# optional 'limits' dict.  By default max_length is the most the limited
+# fields can take once percent-encoded, so that the character limits decide.
+# Names listed in 'multiple' are returned as a list of all their values; for
+# other repeated names the last value wins.
+# Ignores valueless names (a&b), does not support isindex or
+# multipart/form-data.
+def parse_post(max_length=None, limits=None, multiple=()):
+  if max_length is None:
+    if limits:
+      max_length = ENCODED_CHAR * sum(limits.values()) + POST_SLACK
+    else:
+      max_length = MAX_POST
+  try:
+    length = int(environ.get("CONTENT_LENGTH") or 0)
+  except ValueError:
+    length = 0
+  if length > max_length:
+    raise PayloadTooLarge("Request is too large.")
+  return _parse(_read_chunks(sys.stdin.buffer, length), limits or {}, multiple)
+
+
+# Parse a query string (e.g. a=1&b=2) into a dictionary (e.g. {"a": 1, "b": 2}).
+# Same options and rules as parse_post.
+def parse_query(limits=None, multiple=()):
+  return _parse([environ["QUERY_STRING"].encode("utf-8")], limits or {},
+                multiple)
+
+
+def _read_chunks(stream, length):
+  while length > 0:
+    chunk = stream.read(min(CHUNK_SIZE, length))
+    if not chunk:
+      break
+    length -= len(chunk)
+    yield chunk
+
+
+# Incrementally decode one percent-encoded field value.
+class _FieldDecoder:
+  def __init__(self, name, limit):
+    self.name = name
+    self.limit = limit
+    self.decoder = codecs.getincrementaldecoder("utf-8")("replace")
+    # Trailing part of an escape (e.g. "%4") split across chunks.
+    self.pending = b""
+    self.parts = []
+    self.length = 0
+
+  def feed(self, raw, final=False):
+    raw = self.pending + raw
+    split = raw.find(b"%", len(raw) - 2)
+    if split == -1 or final:
+      self.pending = b""
+    else:
+      (raw, self.pending) = (raw[:split], raw[split:])
+    text = self.decoder.decode(_unquote_plus(raw), final)
+    self.length += len(text)
+    if self.limit is not None and self.length > self.limit:
+      raise PayloadTooLarge("Field '%s' is too large." % self.name)
+    self.parts.append(text)
+
+  def finish(self):
+    self.feed(b"", True)
+    return "".join(self.parts)
+
+
+def _unquote_plus(raw):
+  return unquote_to_bytes(raw.replace(b"+", b" "))
+
+
+def _parse(chunks, limits, multiple):
   dict = {}
-  for part in parts:
-    tuple = part.split("=", 1)
-    if len(tuple) == 2:
-      dict[tuple[0]] = unquote(tuple[1])
+  name = b""
+  # Decoder of the current value, or None while reading a name.
+  value = None
+
+  def store():
+    if value.name in multiple:
+      dict.setdefault(value.name, []).append(value.finish())
+    else:
+      dict[value.name] = value.finish()
+
+  for chunk in chunks:
+    pos = 0
+    while pos < len(chunk):
+      if value is None:
+        m = _NAME_END.search(chunk, pos)
+        end = m.start() if m else len(chunk)
+        name += chunk[pos:end]
+        if len(name) > MAX_NAME:
+          raise PayloadTooLarge("Field name is too long.")
+        if m and m[0] == b"=":
+          decoded_name = _unquote_plus(name).decode("utf-8", "replace")
+          value = _FieldDecoder(decoded_name, limits.get(decoded_name))
+        if m:
+          name = b""
+        pos = end + 1
+      else:
+        end = chunk.find(b"&", pos)
+        if end == -1:
+          end = len(chunk)
+        value.feed(chunk[pos:end])
+        if end < len(chunk):
+          store()
+          value = None
+        pos = end + 1
+  if value is not None:
+    store()
   return dict
 
 
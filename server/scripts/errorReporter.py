@@ -16,40 +16,118 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
-"""Log a reported client-side error.
+"""Record reported client-side errors in the error store.
+Clients send up to MAX_BATCH errors per request, as repeated 'error' params
+with one 'url'.  Each long-lived worker of app_server.py samples repeats of
+the same error, and limits how much it takes from each client, so an error
+storm from a bad release can't tie up the workers that also save programs.
+Clients are told to back off with Retry-After.
 """
 
 __author__ = "blocklygames@neil.fraser.name (Neil Fraser)"
 
 import cgi_utils
-import logging
-logging.basicConfig(filename="/bg-logs/javascript.log", encoding="utf-8",
-                    format="%(levelname)s: %(message)s", level=logging.DEBUG)
+import collections
+import error_store
+import random
+import sqlite3
+import time
 from os import environ
 
+# 10 kb is too much.
+MAX_ERROR = 10000
+# Most errors accepted in one request.
+MAX_BATCH = 10
+# Reports of one error recorded per worker per minute before sampling.
+FINGERPRINT_BUDGET = 10
+# Beyond the budget, record one report in this many (counting for all).
+SAMPLE_RATE = 100
+# Reports accepted from one client per worker per minute.
+CLIENT_BUDGET = 30
+# Seconds a client is asked to wait before reporting again.
+RETRY_AFTER = 60
+# Seconds to wait for a busy error store before turning reports away.
+STORE_TIMEOUT = 0.5
 
-print("Content-Type: text/plain")
-method = ""
-if "REQUEST_METHOD" in environ:
-  method = environ["REQUEST_METHOD"]
-if method != "POST":
-  # GET could be a link.
-  print("Status: 405 Method Not Allowed\n")
-  print("Use 'POST', not '%s'." % method)
-else:
-  forms = cgi_utils.parse_post()
-  cgi_utils.force_exist(forms, "error", "url")
-  error = forms["error"]
-  url = forms["url"]
-
-  if not error or not url:
-    print("Status: 406 Not Acceptable\n")
-    print("Missing 'error' or 'url' param.")
-  elif len(error) + len(url) >= 10000:
-    # 10 kb is too much.
-    print("Status: 413 Payload Too Large\n")
-    print("Error is too large.")
+# Reports seen by this worker in the current minute.
+_recent = {
+  "minute": None,
+  "fingerprints": collections.Counter(),
+  "clients": collections.Counter()
+}
+
+
+# Decide which reports of a batch to record.  Returns a list of
+# (error, url, weight) triples and whether any were refused.
+def sample(errors, url, client):
+  minute = int(time.time() // 60)
+  if _recent["minute"] != minute:
+    _recent["minute"] = minute
+    _recent["fingerprints"].clear()
+    _recent["clients"].clear()
+  allowed = max(0, CLIENT_BUDGET - _recent["clients"][client])
+  _recent["clients"][client] += len(errors)
+  reports = []
+  for error in errors[:allowed]:
+    fingerprint = error_store.classify(error, url)[0]
+    _recent["fingerprints"][fingerprint] += 1
+    if _recent["fingerprints"][fingerprint] <= FINGERPRINT_BUDGET:
+      reports.append((error, url, 1))
+    elif random.randrange(SAMPLE_RATE) == 0:
+      reports.append((error, url, SAMPLE_RATE))
+  return (reports, len(errors) > allowed)
+
+
+def main():
+  print("Content-Type: text/plain")
+  method = ""
+  if "REQUEST_METHOD" in environ:
+    method = environ["REQUEST_METHOD"]
+  if method != "POST":
+    # GET could be a link.
+    print("Status: 405 Method Not Allowed\n")
+    print("Use 'POST', not '%s'." % method)
   else:
-    logging.error(forms["url"] + "\n" + forms["error"] + "\n")
-    print("Status: 200 OK\n")
-    print("Error logged.")
+    try:
+      forms = cgi_utils.parse_post(
+          limits={"error": MAX_ERROR, "url": MAX_ERROR}, multiple=("error",))
+    except cgi_utils.PayloadTooLarge:
+      print("Status: 413 Payload Too Large\n")
+      print("Error is too large.")
+      return
+    cgi_utils.force_exist(forms, "error", "url")
+    errors = [error for error in forms["error"] or [] if error]
+    url = forms["url"]
+
+    if not errors or not url:
+      print("Status: 406 Not Acceptable\n")
+      print("Missing 'error' or 'url' param.")
+    elif len(errors) > MAX_BATCH:
+      print("Status: 413 Payload Too Large\n")
+      print("Too many errors.")
+    elif sum(map(len, errors)) + len(url) >= MAX_ERROR:
+      # 10 kb is too much.
+      print("Status: 413 Payload Too Large\n")
+      print("Error is too large.")
+    else:
+      (reports, refused) = sample(errors, url, environ.get("REMOTE_ADDR", ""))
+      try:
+        if reports:
+          error_store.record(reports, timeout=STORE_TIMEOUT)
+      except sqlite3.OperationalError:
+        # Overloaded.
+        print("Retry-After: %d" % RETRY_AFTER)
+        print("Status: 503 Service Unavailable\n")
+        print("Busy, try later.")
+        return
+      if refused:
+        print("Retry-After: %d" % RETRY_AFTER)
+        print("Status: 429 Too Many Requests\n")
+        print("Too many errors, try later.")
+      else:
+        print("Status: 200 OK\n")
+        print("Error logged.")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""Blockly Games: Error Store
+
+Copyright 2026 Google LLC
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""Aggregate client-side errors reported to errorReporter.py.
+Each error is fingerprinted by its game, its message (with numbers blanked
+out) and its top stack frame.  The SQLite store keeps one row per
+fingerprint, with a count, first and last seen times, a sample report and a
+few sample URLs, plus hourly counts.  So a broken deploy adds one row, not a
+million lines.  Show the most common errors with:
+  python error_store.py [--top N] [--hours H] [--game GAME]
+and drop errors not seen in a while with:
+  python error_store.py --prune DAYS
+"""
+
+__author__ = "blocklygames@neil.fraser.name (Neil Fraser)"
+
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import time
+from os import environ
+from urllib.parse import urlsplit
+
+
+# Absolute path of the logs drive.  May be overridden for testing.
+LOGS_PATH = environ.get("BG_LOGS_PATH", "/bg-logs")
+# Sample URLs kept per fingerprint.
+MAX_URLS = 5
+# Longest message or frame kept.
+MAX_FIELD = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS errors (
+  fingerprint TEXT PRIMARY KEY,
+  game TEXT NOT NULL,
+  message TEXT NOT NULL,
+  frame TEXT NOT NULL,
+  sample TEXT NOT NULL,
+  count INTEGER NOT NULL,
+  first REAL NOT NULL,
+  last REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS hours (
+  fingerprint TEXT NOT NULL,
+  hour INTEGER NOT NULL,
+  count INTEGER NOT NULL,
+  PRIMARY KEY (fingerprint, hour)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS hours_hour ON hours (hour);
+CREATE TABLE IF NOT EXISTS urls (
+  fingerprint TEXT NOT NULL,
+  url TEXT NOT NULL,
+  PRIMARY KEY (fingerprint, url)
+) WITHOUT ROWID;
+"""
+
+# A stack frame: "    at f (https://host/file.js:1:2)" in Chrome,
+# "f@https://host/file.js:1:2" in Firefox and Safari.
+FRAME_PATTERN = re.compile(r"(?:^\s*at |@).*:\d+:\d+\)?\s*$")
+
+
+def get_store_name():
+  return LOGS_PATH + "/errors/errors.sqlite"
+
+
+def connect(timeout=10):
+  db = sqlite3.connect(get_store_name(), timeout=timeout)
+  db.execute("PRAGMA journal_mode=WAL")
+  db.execute("PRAGMA synchronous=NORMAL")
+  db.executescript(SCHEMA)
+  return db
+
+
+# Name of the game that reported an error, from its page's URL.
+# E.g. "https://blockly.games/maze?lang=en&level=3" -> "maze"
+def game_name(url):
+  path = urlsplit(url).path.rstrip("/")
+  name = re.sub(r"\.html$", "", path.rsplit("/", 1)[-1])
+  return re.sub(r"[^-\w]", "", name)[:50] or "index"
+
+
+# Split a report into its normalized message and top stack frame.
+# Numbers in the message vary between occurrences of the same error, and so
+# do hosts and query strings in the frame.
+def normalize(error):
+  lines = [line.strip() for line in error.splitlines() if line.strip()]
+  frames = [line for line in lines if FRAME_PATTERN.search(line)]
+  messages = [line for line in lines if not FRAME_PATTERN.search(line)]
+  message = re.sub(r"\d+", "#", messages[0] if messages else "")
+  frame = frames[0] if frames else ""
+  frame = re.sub(r"\w+://[^/\s]+", "", frame)
+  frame = re.sub(r"\?[^\s:)]*", "", frame)
+  return (message[:MAX_FIELD], frame[:MAX_FIELD])
+
+
+# Return (fingerprint, game, message, frame) of a reported error.
+def classify(error, url):
+  game = game_name(url)
+  (message, frame) = normalize(error)
+  text = "\n".join((game, message, frame)).encode("utf-8")
+  return (hashlib.sha1(text).hexdigest()[:16], game, message, frame)
+
+
+# Count reported errors, in one transaction.  'reports' is a list of
+# (error, url, weight) triples, where a weight above one stands for that many
+# identical reports that were sampled away.  Raises sqlite3.OperationalError
+# if the store stays locked for more than 'timeout' seconds.
+def record(reports, now=None, timeout=10):
+  now = now or time.time()
+  os.makedirs(os.path.dirname(get_store_name()), exist_ok=True)
+  db = connect(timeout)
+  try:
+    with db:
+      for (error, url, weight) in reports:
+        (fp, game, message, frame) = classify(error, url)
+        db.execute("INSERT INTO errors VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                   "ON CONFLICT (fingerprint) DO UPDATE "
+                   "SET count = count + excluded.count, last = excluded.last",
+                   (fp, game, message, frame, error, weight, now, now))
+        db.execute("INSERT INTO hours VALUES (?, ?, ?) "
+                   "ON CONFLICT (fingerprint, hour) DO UPDATE "
+                   "SET count = count + excluded.count",
+                   (fp, int(now // 3600), weight))
+        db.execute("INSERT OR IGNORE INTO urls SELECT ?, ? WHERE "
+                   "(SELECT count(*) FROM urls WHERE fingerprint = ?) < ?",
+                   (fp, url, fp, MAX_URLS))
+  finally:
+    db.close()
+
+
+# Return the 'limit' most frequent errors of the last 'hours' hours, most
+# frequent first, as dicts.
+def top(limit, hours, game=None):
+  db = connect()
+  db.row_factory = sqlite3.Row
+  try:
+    rows = db.execute(
+        "SELECT errors.*, sum(hours.count) AS recent FROM hours "
+        "JOIN errors USING (fingerprint) WHERE hour >= ? "
+        "AND (? IS NULL OR game = ?) GROUP BY fingerprint "
+        "ORDER BY recent DESC LIMIT ?",
+        (int(time.time() // 3600) - hours + 1, game, game, limit))
+    data = [dict(row) for row in rows]
+    for datum in data:
+      datum["urls"] = [row[0] for row in db.execute(
+          "SELECT url FROM urls WHERE fingerprint = ?",
+          (datum["fingerprint"],))]
+    return data
+  finally:
+    db.close()
+
+
+# Forget errors not seen in 'days' days, and hourly counts older than that.
+# Returns the number of errors forgotten.
+def prune(days):
+  cutoff = time.time() - days * 60 * 60 * 24
+  db = connect()
+  try:
+    with db:
+      db.execute("DELETE FROM hours WHERE hour < ?", (int(cutoff // 3600),))
+      db.execute("DELETE FROM urls WHERE fingerprint IN "
+                 "(SELECT fingerprint FROM errors WHERE last < ?)", (cutoff,))
+      return db.execute("DELETE FROM errors WHERE last < ?",
+                        (cutoff,)).rowcount
+  finally:
+    db.close()
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Show client-side errors.")
+  parser.add_argument("--top", type=int, default=20,
+                      help="Number of errors to show.")
+  parser.add_argument("--hours", type=int, default=24,
+                      help="Only count errors from the last H hours.")
+  parser.add_argument("--game", help="Only show errors from this game.")
+  parser.add_argument("--prune", type=int, metavar="DAYS",
+                      help="Forget errors not seen in DAYS days, then exit.")
+  args = parser.parse_args()
+
+  if args.prune is not None:
+    print("Forgot %d error(s)." % prune(args.prune))
+    return
+  for datum in top(args.top, args.hours, args.game):
+    print("%d in %dh (%d total) [%s] %s" % (datum["recent"], args.hours,
+          datum["count"], datum["game"], datum["message"]))
+    print("  " + datum["frame"])
+    print("  first seen %s, last seen %s" %
+          (time.ctime(datum["first"]), time.ctime(datum["last"])))
+    for url in datum["urls"]:
+      print("  " + url)
+    print()
+
+
+if __name__ == "__main__":
+  main()
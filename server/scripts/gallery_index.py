@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""Blockly Games: Gallery Index
+
+Copyright 2026 Google LLC
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""Ordered per-app index of gallery records, kept in SQLite.
+Each record is in one moderation state: pending (submitted, not yet
+reviewed), public, or hidden (reviewed and rejected or unpublished).
+The .gallery files remain the source of truth; the index may be regenerated
+from them at any time with:
+  python gallery_index.py rebuild [app ...]
+"""
+
+__author__ = "blocklygames@neil.fraser.name (Neil Fraser)"
+
+import cgi_utils
+import json
+import os
+import re
+import sqlite3
+import struct
+import sys
+
+
+INDEX_NAME = "index.sqlite"
+# Cursor of the first page.
+FIRST_CURSOR = "first"
+
+# Moderation states.
+PENDING = "pending"
+PUBLIC = "public"
+HIDDEN = "hidden"
+STATES = (PENDING, PUBLIC, HIDDEN)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS gallery (
+  key TEXT PRIMARY KEY,
+  created REAL NOT NULL,
+  title TEXT NOT NULL,
+  state TEXT NOT NULL,
+  thumb TEXT
+);
+CREATE INDEX IF NOT EXISTS gallery_state ON gallery (state, created, key);
+CREATE INDEX IF NOT EXISTS gallery_created ON gallery (created, key);
+CREATE INDEX IF NOT EXISTS gallery_unoptimized ON gallery (key)
+  WHERE thumb IS NULL;
+"""
+# Optimized thumbnail variants written by thumbnails.py.  The 'thumb' column
+# holds the best PNG (".png" or ".grid.png"), or NULL until it is optimized.
+THUMB_VARIANTS = (".grid.png", ".grid.webp")
+
+
+# Open the index for an app's gallery.  An index that doesn't exist yet, or
+# is from an older version, is (re)built from the .gallery records.
+def connect(app):
+  file_name = cgi_utils.get_dir(app, "gallery") + INDEX_NAME
+  db = sqlite3.connect(file_name, timeout=10)
+  db.execute("PRAGMA journal_mode=WAL")
+  if not is_current(db):
+    # Several requests may get here at once; only the first builds it.
+    db.execute("BEGIN IMMEDIATE")
+    if is_current(db):
+      db.rollback()
+    else:
+      db.execute("DROP TABLE IF EXISTS gallery")
+      for statement in SCHEMA.split(";"):
+        db.execute(statement)
+      fill(db, app)
+  return db
+
+
+# Whether the index has a table with every column this version uses.
+def is_current(db):
+  columns = {row[1] for row in db.execute("PRAGMA table_info(gallery)")}
+  return {"state", "thumb"}.issubset(columns)
+
+
+# Moderation state of a .gallery record.  Only records a moderator has acted
+# on are marked as reviewed.
+def record_state(datum):
+  if datum.get("public"):
+    return PUBLIC
+  return HIDDEN if datum.get("reviewed") else PENDING
+
+
+# Record a newly submitted gallery entry.  Existing entries are left alone.
+def add(app, key, title, state, created):
+  with connect(app) as db:
+    db.execute("INSERT OR IGNORE INTO gallery VALUES (?, ?, ?, ?, NULL)",
+               (key, created, title, state))
+
+
+# Apply several changes in one transaction.  'changes' maps each key to its
+# new moderation state, or to None to remove the entry.  Returns the earliest
+# creation time of the changed entries, or None if none were indexed.
+def update(app, changes):
+  created = []
+  with connect(app) as db:
+    for (key, state) in changes.items():
+      row = db.execute("SELECT created FROM gallery WHERE key = ?",
+                       (key,)).fetchone()
+      if row:
+        created.append(row[0])
+      if state is None:
+        db.execute("DELETE FROM gallery WHERE key = ?", (key,))
+      else:
+        db.execute("UPDATE gallery SET state = ? WHERE key = ?", (state, key))
+  return min(created, default=None)
+
+
+# Keys of up to 'limit' entries whose thumbnails haven't been optimized.
+def unoptimized(app, limit):
+  db = connect(app)
+  try:
+    return [row[0] for row in db.execute(
+        "SELECT key FROM gallery WHERE thumb IS NULL LIMIT ?", (limit,))]
+  finally:
+    db.close()
+
+
+# Record the best thumbnail variant of several entries.  'thumbs' maps each
+# key to a file extension.  Returns the earliest creation time of the changed
+# entries, or None if none were indexed.
+def set_thumbs(app, thumbs):
+  with connect(app) as db:
+    db.executemany("UPDATE gallery SET thumb = ? WHERE key = ?",
+                   [(thumb, key) for (key, thumb) in thumbs.items()])
+    return db.execute(
+        "SELECT MIN(created) FROM gallery WHERE key IN (%s)" %
+        ",".join("?" * len(thumbs)), tuple(thumbs)).fetchone()[0]
+
+
+# Cursors encode a record's position as (created, key), so they stay valid
+# after that record is deleted.  The creation time is written as the hex of
+# its IEEE double, which round-trips exactly.
+def encode_cursor(created, key):
+  return "%s_%s" % (struct.pack(">d", created).hex(), key)
+
+
+# Decode a cursor into (created, key).  Raises ValueError if malformed.
+def decode_cursor(cursor):
+  (created, sep, key) = cursor.partition("_")
+  if not sep or len(created) != 16 or not re.fullmatch(r"\w+", key):
+    raise ValueError("Invalid cursor: %s" % cursor)
+  return (struct.unpack(">d", bytes.fromhex(created))[0], key)
+
+
+# Return up to 'rows' records starting at the cursor, plus the cursors of the
+# following and preceding pages (or None).  If 'state' is given, only records
+# in that moderation state are returned.  The (state, created, key) and
+# (created, key) indices turn each cursor into a B-tree seek rather than a
+# scan.  Each record is a dict with key, title, state, public and the URL of
+# the best thumbnail.
+def page(app, cursor, rows, state=None):
+  if not os.path.isdir(cgi_utils.get_dir(app, "gallery")):
+    return ([], None, None)
+  (where, params) = ("state = ? AND ", (state,)) if state else ("", ())
+  db = connect(app)
+  try:
+    if not cursor or cursor == FIRST_CURSOR:
+      start = (float("-inf"), "")
+    elif "_" in cursor:
+      start = decode_cursor(cursor)
+    else:
+      # Cursors used to be bare keys.
+      row = db.execute("SELECT created FROM gallery WHERE key = ?",
+                       (cursor,)).fetchone()
+      if not row:
+        # Can't find the cursor.
+        return ([], None, None)
+      start = (row[0], cursor)
+    found = db.execute(
+        "SELECT key, title, state, created, thumb FROM gallery "
+        "WHERE %s(created, key) >= (?, ?) ORDER BY created, key LIMIT ?" %
+        where, params + start + (rows + 1,)).fetchall()
+    previous = db.execute(
+        "SELECT created, key FROM gallery "
+        "WHERE %s(created, key) < (?, ?) "
+        "ORDER BY created DESC, key DESC LIMIT ?" %
+        where, params + start + (rows + 1,)).fetchall()
+  finally:
+    db.close()
+  records = [{
+    "key": key,
+    "title": title,
+    "state": state,
+    "public": state == PUBLIC,
+    "thumb": thumb_url(app, key, thumb)
+  } for (key, title, state, created, thumb) in found[:rows]]
+  next_cursor = None
+  if len(found) > rows:
+    next_cursor = encode_cursor(found[rows][3], found[rows][0])
+  previous_cursor = None
+  if len(previous) > rows:
+    previous_cursor = encode_cursor(*previous[rows - 1])
+  elif previous:
+    previous_cursor = FIRST_CURSOR
+  return (records, next_cursor, previous_cursor)
+
+
+# Append the paging entry expected by the gallery clients to a page of rows.
+def add_cursors(data, next_cursor, previous_cursor):
+  paging = {}
+  if next_cursor:
+    paging["cursor"] = next_cursor
+  if previous_cursor:
+    paging["before"] = previous_cursor
+  if paging:
+    data.append(paging)
+  return data
+
+
+# Public URL of a record's thumbnail, or of one of its variants.  nginx serves
+# these with long-lived cache headers, since a key's thumbnail never changes.
+def thumb_url(app, key, variant=None):
+  return "/data/%s/gallery/%s%s" % (app, key, variant or ".png")
+
+
+# The optimized thumbnail variant on disk, or None.  Any WebP variant is
+# served in its place by nginx, to browsers that accept it.
+def find_thumb(app, key):
+  if os.path.exists(cgi_utils.find_path(app, "gallery", key, ".grid.png")):
+    return ".grid.png"
+  return None
+
+
+# Load one .gallery record.
+def load(app, key):
+  file_name = cgi_utils.find_path(app, "gallery", key, ".gallery")
+  try:
+    with open(file_name) as f:
+      return json.load(f)
+  except FileNotFoundError:
+    return None
+  except ValueError:
+    return {"title": "Invalid JSON", "public": False}
+
+
+# When a record was first submitted.  The .gallery file is rewritten on
+# publish, but its thumbnail never is.
+def created_time(app, key):
+  try:
+    return os.path.getctime(cgi_utils.find_path(app, "gallery", key, ".png"))
+  except OSError:
+    return os.path.getctime(
+        cgi_utils.find_path(app, "gallery", key, ".gallery"))
+
+
+# Index every .gallery file of an app.  Returns the number of records.
+def fill(db, app):
+  rows = []
+  for name in cgi_utils.glob_files(app, "gallery", ".gallery"):
+    key = re.search(r"(\w+)\.gallery$", name)[1]
+    datum = load(app, key)
+    if datum is None:
+      continue
+    rows.append((key, created_time(app, key), datum.get("title", ""),
+                 record_state(datum), find_thumb(app, key)))
+  with db:
+    db.execute("DELETE FROM gallery")
+    db.executemany("INSERT INTO gallery VALUES (?, ?, ?, ?, ?)", rows)
+  return len(rows)
+
+
+# Regenerate an app's index from its .gallery files.
+def rebuild(app):
+  db = connect(app)
+  try:
+    return fill(db, app)
+  finally:
+    db.close()
+
+
+if __name__ == "__main__":
+  if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+    print("Format: %s rebuild [app ...]" % sys.argv[0])
+    sys.exit(2)
+  for app in sys.argv[2:] or cgi_utils.get_apps("gallery"):
+    print("Indexed %d %s record(s)." % (rebuild(app), app))
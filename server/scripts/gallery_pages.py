@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""Blockly Games: Gallery Page Materializer
+
+Copyright 2026 Google LLC
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""Write the public gallery_view.py responses as static files.
+Each page is saved as <app>/gallery/pages/<cursor>.json so that nginx can
+answer gallery_view.py requests without running Python.  Publishing or
+deleting a record rewrites only the pages that changed.  With SPRITES
+enabled, each page also gets a sprite sheet of its thumbnails.  Sheets are
+too slow to build during a request, so requests leave them to thumbnails.py,
+and pages only point at sheets that exist.  After rebuilding the index or
+enabling SPRITES, regenerate every page (and sheet) with:
+  python gallery_pages.py [app ...]
+"""
+
+__author__ = "blocklygames@neil.fraser.name (Neil Fraser)"
+
+import cgi_utils
+import gallery_index
+import gallery_sprites
+import glob
+import json
+import os
+import sys
+
+
+# Number of rows per page.  Must match ROWS_PAGE in scripts/gallery_view.py.
+ROWS_PAGE = 24
+# Combine each page's thumbnails into one image (see gallery_sprites.py).
+SPRITES = False
+
+
+def get_pages_dir(app):
+  return cgi_utils.get_dir(app, "gallery") + "pages/"
+
+
+# Write a file only if its content has changed.  Returns True if written.
+def write_if_changed(file_name, text):
+  try:
+    with open(file_name) as f:
+      if f.read() == text:
+        return False
+  except FileNotFoundError:
+    pass
+  temp_name = file_name + ".tmp"
+  with open(temp_name, "w") as f:
+    f.write(text)
+  os.replace(temp_name, file_name)
+  return True
+
+
+# Name of the page starting at rows[start]: the cursor that leads to it.
+def page_name(rows, start):
+  if not start:
+    return gallery_index.FIRST_CURSOR
+  (key, title, created, thumb) = rows[start]
+  return gallery_index.encode_cursor(created, key)
+
+
+# Regenerate the static pages of an app's public gallery.
+# If 'since' is the creation time of a changed record, pages ending before
+# that record are known to be unchanged and are skipped.
+# Sprite sheets are only built if 'build' is set; otherwise a missing sheet is
+# requested from thumbnails.py, and its page is left without sprites.
+# Returns the number of page and sprite files written or deleted.
+def materialize(app, since=None, build=False):
+  db = gallery_index.connect(app)
+  try:
+    rows = db.execute("SELECT key, title, created, thumb FROM gallery "
+                      "WHERE state = ? ORDER BY created, key",
+                      (gallery_index.PUBLIC,)).fetchall()
+  finally:
+    db.close()
+
+  dir = get_pages_dir(app)
+  os.makedirs(dir, exist_ok=True)
+  names = set()
+  sprites = set()
+  changes = 0
+  for start in range(0, max(len(rows), 1), ROWS_PAGE):
+    name = page_name(rows, start)
+    names.add(name)
+    chunk = rows[start:start + ROWS_PAGE]
+    if SPRITES and chunk:
+      sprite = gallery_sprites.sprite_name(
+          [(key, thumb) for (key, title, created, thumb) in chunk])
+      sprites.add(sprite)
+    # A page can't have changed if everything up to and including the next
+    # page's cursor predates the changed record.
+    end = start + ROWS_PAGE
+    if since is not None and end < len(rows) and rows[end][2] < since:
+      continue
+    data = [{
+      "key": key,
+      "title": title,
+      "thumb": gallery_index.thumb_url(app, key, thumb)
+    } for (key, title, created, thumb) in chunk]
+    if SPRITES and chunk:
+      keys = [row[0] for row in chunk]
+      if build and gallery_sprites.write(app, sprite, keys):
+        changes += 1
+      if gallery_sprites.exists(app, sprite):
+        gallery_sprites.add_coordinates(app, data, sprite)
+      elif not build:
+        gallery_sprites.request(app)
+    gallery_index.add_cursors(data,
+        end < len(rows) and page_name(rows, end),
+        start and page_name(rows, start - ROWS_PAGE))
+    if write_if_changed(dir + name + ".json", json.dumps(data) + "\n"):
+      changes += 1
+
+  # Delete pages whose cursor no longer starts a page.
+  for file_name in glob.glob(dir + "*.json"):
+    if os.path.basename(file_name)[:-len(".json")] not in names:
+      os.remove(file_name)
+      changes += 1
+  if SPRITES:
+    changes += gallery_sprites.prune(app, sprites)
+  return changes
+
+
+if __name__ == "__main__":
+  for app in sys.argv[1:] or cgi_utils.get_apps("gallery"):
+    print("%s: %d page file(s) changed." % (app, materialize(app, build=True)))
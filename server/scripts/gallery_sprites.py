@@ -0,0 +1,140 @@
+"""Blockly Games: Gallery Sprite Sheets
+
+Copyright 2026 Google LLC
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""Combine the thumbnails of a static gallery page into one image.
+Used by gallery_pages.py when SPRITES is enabled, which requires Pillow.
+Each sheet is a single column of thumbnails, stored as
+<app>/gallery/sprites/<hash>.png, where the hash covers the page's keys and
+thumbnail variants.  So a sheet is only built when a page's membership
+changes, and can be cached forever.  Sheets are built by thumbnails.py;
+requests that need a new one leave a 'pending' file for it in the same
+directory.
+"""
+
+__author__ = "blocklygames@neil.fraser.name (Neil Fraser)"
+
+import cgi_utils
+import glob
+import hashlib
+import os
+
+try:
+  from PIL import Image
+except ImportError:
+  # Sheets are only built if Pillow is installed.
+  Image = None
+
+
+# Size of each thumbnail in a sheet.  Matches thumbnails.GRID_SIZE.
+CELL_SIZE = 200
+# Marks an app whose pages are waiting for sheets.
+PENDING = "pending"
+
+
+def get_sprites_dir(app):
+  return cgi_utils.get_dir(app, "gallery") + "sprites/"
+
+
+# File name of the sheet for a page of (key, thumbnail variant) pairs.
+def sprite_name(thumbs):
+  text = ",".join("%s%s" % (key, thumb or "") for (key, thumb) in thumbs)
+  return hashlib.sha1(text.encode("utf-8")).hexdigest()[:20] + ".png"
+
+
+def exists(app, name):
+  return os.path.exists(get_sprites_dir(app) + name)
+
+
+# Ask thumbnails.py to build an app's missing sheets.
+def request(app):
+  if not Image:
+    # Nothing would ever build them.
+    return
+  os.makedirs(get_sprites_dir(app), exist_ok=True)
+  with open(get_sprites_dir(app) + PENDING, "w"):
+    pass
+
+
+# Return True if sheets had been requested for an app, clearing the request.
+# It is cleared before the sheets are built, so that requests made meanwhile
+# are kept.
+def take_request(app):
+  try:
+    os.remove(get_sprites_dir(app) + PENDING)
+    return True
+  except FileNotFoundError:
+    return False
+
+
+# One thumbnail, scaled to fill a cell, or None if it is missing or can't be
+# decoded.
+def load_cell(app, key):
+  file_name = cgi_utils.find_path(app, "gallery", key, ".grid.png")
+  if not os.path.exists(file_name):
+    file_name = cgi_utils.find_path(app, "gallery", key, ".png")
+  try:
+    image = Image.open(file_name, formats=["PNG"])
+    image.load()
+  except (OSError, ValueError):
+    return None
+  if image.size != (CELL_SIZE, CELL_SIZE):
+    # Weight colours by alpha, so that transparent pixels don't darken edges.
+    image = image.convert("RGBa").resize((CELL_SIZE, CELL_SIZE), Image.BOX)
+  return image.convert("RGBA")
+
+
+# Write a page's sheet unless it already exists.  Returns True if written.
+def write(app, name, keys):
+  if not Image or exists(app, name):
+    return False
+  file_name = get_sprites_dir(app) + name
+  os.makedirs(get_sprites_dir(app), exist_ok=True)
+  # Missing thumbnails are left transparent.
+  sheet = Image.new("RGBA", (CELL_SIZE, CELL_SIZE * len(keys)))
+  for (index, key) in enumerate(keys):
+    cell = load_cell(app, key)
+    if cell:
+      sheet.paste(cell, (0, index * CELL_SIZE))
+  temp_name = "%s.%d.tmp" % (file_name, os.getpid())
+  sheet.save(temp_name, "PNG", optimize=True)
+  os.replace(temp_name, file_name)
+  return True
+
+
+# Add each record's position in the page's sheet.  Clients that understand
+# 'sprite' may draw every thumbnail of the page from the one image.
+def add_coordinates(app, data, name):
+  for (index, datum) in enumerate(data):
+    datum["sprite"] = {
+      "url": "/data/%s/gallery/sprites/%s" % (app, name),
+      "x": 0,
+      "y": index * CELL_SIZE,
+      "size": CELL_SIZE,
+      "width": CELL_SIZE,
+      "height": CELL_SIZE * len(data)
+    }
+  return data
+
+
+# Delete sheets that no page uses any more.  Returns the number deleted.
+def prune(app, names):
+  count = 0
+  for file_name in glob.glob(get_sprites_dir(app) + "*.png"):
+    if os.path.basename(file_name) not in names:
+      os.remove(file_name)
+      count += 1
+  return count
@@ -24,11 +24,16 @@ __author__ = "blocklygames@neil.fraser.name (Neil Fraser)"
 import base64
 import json
 import cgi_utils
+import gallery_index
 import os
 import storage
+import time
 
 
 THUMB_PREFIX = 'data:image/png;base64,'
+# A base64 encoded 200x200 pixel PNG of random static is 172,370 bytes.
+# 250kb should be enough to handle anything valid.
+MAX_THUMB = 250000
 
 def check_gallery(title, thumb):
   if not title:
@@ -47,48 +52,75 @@ def check_gallery(title, thumb):
     print("Status: 406 Not Acceptable\n")
     print("Thumbnail isn't a base64 PNG.")
     return False
-  if len(thumb) > 250000:
-    # A base64 encoded 200x200 pixel PNG of random static is 172,370 bytes.
-    # 250kb should be enough to handle anything valid.
+  if len(thumb) > MAX_THUMB:
     print("Status: 413 Payload Too Large\n")
     print("Thumbnail is too large.")
     return False
   return True
 
 
-def store_gallery(key, app, title, thumb):
+# Returns the paths written.
+def store_gallery(key, app, title, thumb, created=None):
+  # The thumbnail is stored and served separately as a .png file.
   obj = {
     "title": title,
-    "thumb": thumb,
     "public": False
   }
   text = json.dumps(obj)
+  paths = []
 
   # Save the gallery data to a file if one doesn't already exist.
-  file_name = cgi_utils.get_dir(app, "gallery") + key + ".gallery"
+  file_name = cgi_utils.find_path(app, "gallery", key, ".gallery")
   if not os.path.exists(file_name):
+    file_name = cgi_utils.make_path(app, "gallery", key, ".gallery")
     with open(file_name, "w") as f:
       f.write(text)
+    paths.append(file_name)
 
   # Save the gallery image to a file if one doesn't already exist.
-  file_name = cgi_utils.get_dir(app, "gallery") + key + ".png"
+  file_name = cgi_utils.find_path(app, "gallery", key, ".png")
   if not os.path.exists(file_name):
+    file_name = cgi_utils.make_path(app, "gallery", key, ".png")
     img = base64.standard_b64decode(thumb[len(THUMB_PREFIX):])
     with open(file_name, "wb") as f:
       f.write(img)
+    paths.append(file_name)
 
+  gallery_index.add(app, key, title, gallery_index.PENDING,
+                    created or time.time())
+  return paths
 
-if __name__ == "__main__":
-  forms = cgi_utils.parse_post()
+
+def main():
+  print("Content-Type: text/plain")
+  try:
+    forms = cgi_utils.parse_post(limits={
+      "data": storage.MAX_DATA,
+      "thumb": MAX_THUMB,
+      # Checked precisely after stripping whitespace.
+      "title": 1000
+    })
+  except cgi_utils.PayloadTooLarge as e:
+    print("Status: 413 Payload Too Large\n")
+    print(e)
+    return
   cgi_utils.force_exist(forms, "app", "data", "thumb", "title")
   app = forms["app"] or ""
   data = forms["data"]
   title = (forms["title"] or "").strip()
   thumb = (forms["thumb"] or "").strip()
 
-  print("Content-Type: text/plain")
   if storage.check(app, data) and check_gallery(title, thumb):
-    key = storage.store(app, data)
-    store_gallery(key, app, title, thumb)
+    if storage.JOURNAL:
+      # Journaled in the same commit as the program.
+      key = storage.store(app, data, [{"kind": "gallery", "app": app,
+          "title": title, "thumb": thumb, "created": time.time()}])
+    else:
+      key = storage.store(app, data)
+      store_gallery(key, app, title, thumb)
     print("Status: 200 OK\n")
     print(key)
+
+
+if __name__ == "__main__":
+  main()
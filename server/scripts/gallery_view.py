@@ -22,21 +22,20 @@ limitations under the License.
 __author__ = "blocklygames@neil.fraser.name (Neil Fraser)"
 
 import cgi_utils
+import gallery_index
 import json
-import glob
-import os
 import re
 
 # Called with two arguments:
 # - app: turtle/movie/music
-# - cursor: Key to the next page of results.
+# - cursor: Cursor to the next or previous page of results.
 # Returns a JSON object.
 
 # Number of rows per page.
 ROWS_PAGE = 24
 
 
-if __name__ == "__main__":
+def main():
   forms = cgi_utils.parse_query()
   cgi_utils.force_exist(forms, "app", "cursor")
   app = forms["app"] or ""
@@ -52,34 +51,20 @@ if __name__ == "__main__":
     print("Status: 406 Not Acceptable\n")
     print("That is not a valid cursor.")
   else:
-    dir = cgi_utils.get_dir(app, "gallery")
-    names = sorted(glob.glob("%s*.gallery" % dir), key=os.path.getctime)
-
-    # Trim off all entries before the cursor.
-    if cursor:
-      cursor_name = "/%s.gallery" % cursor
-      cursor_index = [i for i, name in enumerate(names) if name.endswith(cursor_name)]
-      if len(cursor_index):
-        names = names[cursor_index[0]:]
-      else:
-        # Can't find the cursor.
-        names = []
-    data = [];
-    for name in names:
-      m = re.search(r"/(\w+)\.gallery$", name)
-      if not m:
-        continue
-      with open(name) as f:
-        try:
-          datum = json.load(f)
-        except:
-          datum = {"title": "Invalid JSON"}
-      if datum["public"]:
-        if len(data) >= ROWS_PAGE:
-          data.append({"cursor": m[1]})
-          break
-        del datum["public"]
-        datum["key"] = m[1]
-        data.append(datum)
+    try:
+      (data, next_cursor, previous_cursor) = gallery_index.page(
+          app, cursor, ROWS_PAGE, gallery_index.PUBLIC)
+    except ValueError:
+      print("Status: 406 Not Acceptable\n")
+      print("That is not a valid cursor.")
+      return
+    for datum in data:
+      del datum["state"]
+      del datum["public"]
+    gallery_index.add_cursors(data, next_cursor, previous_cursor)
     print("Status: 200 OK\n")
     print(json.dumps(data))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,239 @@
+"""Blockly Games: Write Journal
+
+Copyright 2026 Google LLC
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""Append-only journal of submissions, with group commit.
+When storage.JOURNAL is enabled, requests append their records here and
+return as soon as the journal is on disk; journal_flush.py later moves the
+records into their final files.  Concurrent requests share fsyncs: whoever
+syncs the journal covers everything appended before it, so under load one
+fsync acknowledges a whole batch of requests.
+
+Each record is one line of "<crc32> <json>", preceded by a newline so that a
+line torn by a crash can't swallow the record after it.  Torn or corrupt
+lines were never acknowledged, and are skipped on replay.  Each file starts
+with a header naming its generation, which fsyncs are shared within.
+
+Names (such as program keys) that journaled records will take are reserved
+in a small SQLite table until their generation is flushed, so that appending
+never has to read the journal back.
+"""
+
+__author__ = "blocklygames@neil.fraser.name (Neil Fraser)"
+
+import cgi_utils
+import fcntl
+import glob
+import json
+import os
+import sqlite3
+import time
+import zlib
+
+
+CURRENT = "current.log"
+# Starts each journal file, followed by the generation: its creation time in
+# nanoseconds.
+HEADER = b"journal "
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reservations (
+  name TEXT PRIMARY KEY,
+  value TEXT NOT NULL,
+  generation INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+# This process's connection to the reservations, opened on first use.
+_db = None
+
+
+def get_journal_dir():
+  return cgi_utils.DATA_PATH + "/journal/"
+
+
+def encode(record):
+  text = json.dumps(record, separators=(",", ":")).encode("utf-8")
+  return b"\n%08x %s" % (zlib.crc32(text), text)
+
+
+# Return the intact records of a journal file, in order.
+def read(file_name):
+  records = []
+  with open(file_name, "rb") as f:
+    for line in f.read().split(b"\n"):
+      (crc, sep, text) = line.partition(b" ")
+      if sep and crc == b"%08x" % zlib.crc32(text):
+        records.append(json.loads(text))
+  return records
+
+
+def fsync_dir(dir):
+  fd = os.open(dir, os.O_RDONLY)
+  try:
+    os.fsync(fd)
+  finally:
+    os.close(fd)
+
+
+# Make sure a journal file is on disk up to 'end'.  The last synced position
+# is shared through the sync file, so a request whose records were covered by
+# another request's fsync returns without one of its own.  Positions are only
+# comparable within one generation of current.log: a new file may reuse a
+# deleted file's inode, but never its generation.
+def sync(fd, generation, end):
+  if not generation:
+    # The header was lost in a crash, so don't share fsyncs of this file.
+    os.fdatasync(fd)
+    return
+  dir = get_journal_dir()
+  with open(dir + "sync", "a+") as f:
+    fcntl.flock(f, fcntl.LOCK_EX)
+    f.seek(0)
+    state = f.read().split()
+    if state and state[0] == generation and int(state[1]) >= end:
+      return
+    size = os.fstat(fd).st_size
+    os.fdatasync(fd)
+    f.truncate(0)
+    f.write("%s %d" % (generation, size))
+
+
+# Return the generation of a journal file, from its header, or None if it
+# has none.
+def read_generation(fd):
+  header = os.pread(fd, len(HEADER) + 20, 0)
+  if header.startswith(HEADER) and len(header) == len(HEADER) + 20:
+    return header[len(HEADER):].decode()
+  return None
+
+
+# Return this process's connection to the reservations.
+def connect():
+  global _db
+  if _db is None or _db[0] != os.getpid():
+    db = sqlite3.connect(get_journal_dir() + "reservations.sqlite", timeout=10)
+    db.execute("PRAGMA journal_mode=WAL")
+    # A reservation lost in a crash only matters until the journal_flush.py
+    # pass after the restart, which writes its records out.
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.executescript(SCHEMA)
+    _db = (os.getpid(), db)
+  return _db[1]
+
+
+# Durably append records to the journal.  To reserve a name for the records
+# until they are flushed, pass it with a 'value' identifying their content,
+# and a function 'taken' returning the value of whatever already holds the
+# name outside the journal, or None.  If the name is reserved or taken,
+# nothing is appended and the holder's value is returned.  Otherwise returns
+# None.
+def append(records, name=None, value=None, taken=None):
+  dir = get_journal_dir()
+  os.makedirs(dir, exist_ok=True)
+  data = b"".join(encode(record) for record in records)
+  # Write under the lock, so that rotate() never seals a file that is still
+  # being written.  Syncing happens after the lock is released.
+  fd = None
+  try:
+    with open(dir + "lock", "a") as lock:
+      fcntl.flock(lock, fcntl.LOCK_EX)
+      if name is not None:
+        row = connect().execute("SELECT value FROM reservations "
+                                "WHERE name = ?", (name,)).fetchone()
+        # Checked second: a flush writes records out before releasing them.
+        holder = row[0] if row else taken()
+        if holder is not None:
+          return holder
+      created = not os.path.exists(dir + CURRENT)
+      fd = os.open(dir + CURRENT, os.O_RDWR | os.O_APPEND | os.O_CREAT,
+                    0o644)
+      if created:
+        # Records are preceded by a newline, so the header never swallows one.
+        data = b"%s%020d" % (HEADER, time.time_ns()) + data
+      view = memoryview(data)
+      while view:
+        view = view[os.write(fd, view):]
+      end = os.lseek(fd, 0, os.SEEK_CUR)
+      generation = read_generation(fd)
+      if created:
+        # A new file's name must be on disk before any of its records are
+        # acknowledged.
+        fsync_dir(dir)
+      if name is not None:
+        with connect() as db:
+          db.execute("INSERT INTO reservations VALUES (?, ?, ?)",
+                     (name, value, int(generation or 0)))
+    sync(fd, generation, end)
+  finally:
+    if fd is not None:
+      os.close(fd)
+  return None
+
+
+# Seal the current journal file so that new records go to a fresh one.
+# Returns the time of sealing, which is later than the generation of every
+# sealed file and earlier than that of any file created afterwards.
+def rotate():
+  dir = get_journal_dir()
+  with open(dir + "lock", "a") as lock:
+    fcntl.flock(lock, fcntl.LOCK_EX)
+    now = time.time_ns()
+    if os.path.exists(dir + CURRENT):
+      os.rename(dir + CURRENT, "%s%020d.log" % (dir, now))
+      fsync_dir(dir)
+  return now
+
+
+# Sealed journal files, oldest first.
+def sealed():
+  return sorted(glob.glob(get_journal_dir() + "[0-9]*.log"))
+
+
+# Pass every journaled record to 'apply', oldest first, then drop the journal
+# files and their reservations.  'apply' must be idempotent, since a crash may
+# replay a record that was already applied, and returns the paths it wrote.
+# Returns the number of records applied.
+def flush(apply):
+  if not os.path.isdir(get_journal_dir()):
+    return 0
+  sealed_at = rotate()
+  count = 0
+  for file_name in sealed():
+    paths = set()
+    for record in read(file_name):
+      paths.update(apply(record))
+      count += 1
+    # The applied files must be on disk before their journal is deleted.
+    for path in paths:
+      try:
+        fd = os.open(path, os.O_RDONLY)
+      except FileNotFoundError:
+        # An SQLite write-ahead log is synced into its database and deleted
+        # when the last connection closes.
+        continue
+      try:
+        os.fsync(fd)
+      finally:
+        os.close(fd)
+    for dir in {os.path.dirname(path) for path in paths}:
+      fsync_dir(dir)
+    os.remove(file_name)
+  # Every record of these generations is on disk now.  A file whose header
+  # was lost reserved its names under generation 0.
+  with connect() as db:
+    db.execute("DELETE FROM reservations WHERE generation < ?", (sealed_at,))
+  return count
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Blockly Games: Journal Flusher
+
+Copyright 2026 Google LLC
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""Move journaled submissions into their final files.
+Needed when storage.JOURNAL is enabled.  Each pass first replays whatever a
+crash left behind, so run it at boot and then continuously:
+  python journal_flush.py [--watch SECONDS]
+Programs only become readable at their URL once flushed, so keep the
+interval short.
+"""
+
+__author__ = "blocklygames@neil.fraser.name (Neil Fraser)"
+
+import argparse
+import gallery_submit
+import gzip
+import journal
+import storage
+import sys
+import time
+
+
+# Write one journaled record to its final place.  Records already written
+# are left alone.  Returns the paths written.
+def apply(record):
+  app = record["app"]
+  key = record["key"]
+  if record["kind"] == "program":
+    binary_data = record["data"].encode("UTF-8")
+    paths = storage.write(app, key, gzip.compress(binary_data, mtime=0))
+    if not paths and storage.load(app, key) != binary_data:
+      # Keys are reserved when journaled, so only a program saved while the
+      # journal was switched off can get here.
+      print("%s/%s: key collision, program dropped." % (app, key),
+            file=sys.stderr)
+    return paths
+  if record["kind"] == "gallery":
+    return gallery_submit.store_gallery(key, app, record["title"],
+                                        record["thumb"], record["created"])
+  print("Unknown journal record: %s" % record["kind"], file=sys.stderr)
+  return []
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Flush the write journal.")
+  parser.add_argument("--watch", type=float, metavar="SECONDS",
+                      help="Keep flushing at this interval.")
+  args = parser.parse_args()
+  while True:
+    count = journal.flush(apply)
+    if count:
+      print("Flushed %d record(s)." % count)
+      sys.stdout.flush()
+    if args.watch is None:
+      break
+    time.sleep(args.watch)
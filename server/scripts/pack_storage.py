@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""Blockly Games: Pack Storage
+
+Copyright 2026 Google LLC
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""Optional log-structured storage backend for programs.
+Instead of one file per program, records are appended to large segment files
+in <app>/packs/, with an SQLite index of key -> (segment, offset, length).
+Enabled by storage.PACK_STORAGE; programs are then read through
+storage_load.py.  Expired and superseded records are dropped by compaction,
+run from the command line (e.g. from cron):
+  python pack_storage.py compact [app ...]
+"""
+
+__author__ = "blocklygames@neil.fraser.name (Neil Fraser)"
+
+import cgi_utils
+import fcntl
+import glob
+import os
+import re
+import sqlite3
+import struct
+import sys
+import time
+
+
+# Start a new segment once the current one reaches this size.
+SEGMENT_SIZE = 256 * 1024 * 1024
+# Records not read for this many days are dropped by compaction.
+AGE_DAYS = 365 * 2
+# Record header: magic, key length, data length.
+HEADER = struct.Struct(">4sHI")
+MAGIC = b"BGPK"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+  key TEXT PRIMARY KEY,
+  segment INTEGER NOT NULL,
+  offset INTEGER NOT NULL,
+  length INTEGER NOT NULL,
+  stored INTEGER NOT NULL,
+  accessed INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS records_segment ON records (segment);
+"""
+
+
+def get_pack_dir(app):
+  return cgi_utils.get_dir(app, "packs")
+
+
+def segment_name(app, segment):
+  return "%sseg-%08d.pack" % (get_pack_dir(app), segment)
+
+
+def today():
+  return int(time.time() // (60 * 60 * 24))
+
+
+def connect(app):
+  db = sqlite3.connect(get_pack_dir(app) + "index.sqlite", timeout=10)
+  db.execute("PRAGMA journal_mode=WAL")
+  db.execute("PRAGMA synchronous=NORMAL")
+  db.executescript(SCHEMA)
+  return db
+
+
+# Return the numbers of an app's segments, oldest first.
+def segments(app):
+  return sorted(int(re.search(r"seg-(\d+)\.pack$", name)[1])
+                for name in glob.glob(get_pack_dir(app) + "seg-*.pack"))
+
+
+# Append one record to the app's current segment, holding the app's pack lock
+# so that concurrent writers never interleave.  Returns (segment, offset).
+def write_record(app, key, data):
+  os.makedirs(get_pack_dir(app), exist_ok=True)
+  key_bytes = key.encode("utf-8")
+  record = HEADER.pack(MAGIC, len(key_bytes), len(data)) + key_bytes + data
+  with open(get_pack_dir(app) + "lock", "w") as lock:
+    fcntl.flock(lock, fcntl.LOCK_EX)
+    segment = (segments(app) or [1])[-1]
+    name = segment_name(app, segment)
+    if os.path.exists(name) and os.path.getsize(name) >= SEGMENT_SIZE:
+      segment += 1
+      name = segment_name(app, segment)
+    with open(name, "ab") as f:
+      offset = f.tell()
+      f.write(record)
+  return (segment, offset)
+
+
+# Store a program's (compressed) data under a new key.  Returns the name of
+# the segment written, or None if the key is already taken.
+def append(app, key, data):
+  (segment, offset) = write_record(app, key, data)
+  day = today()
+  try:
+    with connect(app) as db:
+      db.execute("INSERT INTO records VALUES (?, ?, ?, ?, ?, ?)",
+                 (key, segment, offset, len(data), day, day))
+  except sqlite3.IntegrityError:
+    # The orphaned record is dropped by the next compaction.
+    return None
+  return segment_name(app, segment)
+
+
+# Read the record at a location.  Raises ValueError if it isn't 'key'.
+def read_record(app, key, segment, offset):
+  with open(segment_name(app, segment), "rb") as f:
+    f.seek(offset)
+    (magic, key_length, length) = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or f.read(key_length).decode("utf-8") != key:
+      raise ValueError("Corrupt pack record for %s" % key)
+    return f.read(length)
+
+
+# Return a program's (compressed) data, or None if it isn't packed.
+def fetch(app, key, touch=True):
+  if not os.path.exists(get_pack_dir(app) + "index.sqlite"):
+    return None
+  db = connect(app)
+  try:
+    # Compaction may move the record between the lookup and the read.
+    for attempt in range(2):
+      row = db.execute("SELECT segment, offset, accessed FROM records "
+                       "WHERE key = ?", (key,)).fetchone()
+      if not row:
+        return None
+      try:
+        data = read_record(app, key, row[0], row[1])
+        break
+      except FileNotFoundError:
+        if attempt:
+          raise
+    if touch and row[2] != today():
+      with db:
+        db.execute("UPDATE records SET accessed = ? WHERE key = ?",
+                   (today(), key))
+    return data
+  finally:
+    db.close()
+
+
+# Copy live records out of every sealed segment, drop the expired ones and
+# delete the old segments.  'keep' is a function that returns True for keys
+# that must never expire.  Returns (records kept, records dropped).
+def compact(app, keep):
+  sealed = segments(app)[:-1]
+  if not sealed:
+    return (0, 0)
+  oldest = today() - AGE_DAYS
+  kept = 0
+  dropped = 0
+  db = connect(app)
+  try:
+    for segment in sealed:
+      rows = db.execute("SELECT key, offset, accessed FROM records "
+                        "WHERE segment = ?", (segment,)).fetchall()
+      for (key, offset, accessed) in rows:
+        if accessed < oldest and not keep(key):
+          with db:
+            db.execute("DELETE FROM records WHERE key = ? AND segment = ? "
+                       "AND offset = ?", (key, segment, offset))
+          dropped += 1
+          continue
+        data = read_record(app, key, segment, offset)
+        (new_segment, new_offset) = write_record(app, key, data)
+        with db:
+          # Only repoint the index if the key wasn't saved again meanwhile.
+          db.execute("UPDATE records SET segment = ?, offset = ? "
+                     "WHERE key = ? AND segment = ? AND offset = ?",
+                     (new_segment, new_offset, key, segment, offset))
+        kept += 1
+      os.remove(segment_name(app, segment))
+  finally:
+    db.close()
+  return (kept, dropped)
+
+
+# Programs linked from a gallery record never expire.
+def in_gallery(app):
+  return lambda key: os.path.exists(
+      cgi_utils.find_path(app, "gallery", key, ".gallery"))
+
+
+if __name__ == "__main__":
+  if len(sys.argv) < 2 or sys.argv[1] != "compact":
+    print("Format: %s compact [app ...]" % sys.argv[0])
+    sys.exit(2)
+  for app in sys.argv[2:] or cgi_utils.get_apps("packs"):
+    (kept, dropped) = compact(app, in_gallery(app))
+    print("%s: kept %d record(s), dropped %d." % (app, kept, dropped))
@@ -21,14 +21,27 @@ limitations under the License.
 
 __author__ = "blocklygames@neil.fraser.name (Neil Fraser)"
 
+import gzip
 import hashlib
 import os
 import random
 import re
 import cgi_utils
+import journal
+import pack_storage
 
 
 POISON = "{[(< UNTRUSTED CONTENT >)]}\n"
+# Append programs to segment files instead of writing one file per program.
+# Requires nginx to route program reads through storage_load.py.
+PACK_STORAGE = False
+# Acknowledge new programs once they are in the write journal, and leave
+# writing their files to journal_flush.py, which must then be running.
+JOURNAL = False
+# Number of keys to try before giving up on saving a program.
+MAX_ATTEMPTS = 10
+# Programs must be shorter than one megabyte.
+MAX_DATA = 1000000
 
 def keyGen(seed_string):
   random.seed(seed_string)
@@ -64,7 +77,7 @@ def check(app, data):
     print("Status: 406 Not Acceptable\n")
     print("That is not a valid app.")
     return False
-  if len(data) >= 1000000:
+  if len(data) >= MAX_DATA:
     # One megabyte is too much.
     print("Status: 413 Payload Too Large\n")
     print("Your program is too large.")
@@ -72,30 +85,136 @@ def check(app, data):
   return True
 
 
-def store(app, data):
+# Return the stored content of a key as bytes, or None if the key is free.
+def load(app, key):
+  data = None
+  if PACK_STORAGE:
+    data = pack_storage.fetch(app, key, touch=False)
+  if data is None:
+    file_name = cgi_utils.find_path(app, "storage", key, ".blockly.gz")
+    if not os.path.exists(file_name):
+      # Not yet converted by storage_compress.py.
+      file_name = cgi_utils.find_path(app, "storage", key, ".blockly")
+      if not os.path.exists(file_name):
+        return None
+      with open(file_name, "rb") as f:
+        return f.read()
+    with open(file_name, "rb") as f:
+      data = f.read()
+  return gzip.decompress(data)
+
+
+# Mark a stored program as just saved, as rewriting it used to, so that saving
+# it again postpones its expiry.
+def touch(app, key):
+  if PACK_STORAGE and pack_storage.fetch(app, key, touch=True) is not None:
+    return
+  for ext in (".blockly.gz", ".blockly"):
+    try:
+      os.utime(cgi_utils.find_path(app, "storage", key, ext))
+      return
+    except FileNotFoundError:
+      pass
+
+
+# Write a new key.  Returns the paths written, or an empty list if the key was
+# taken in the meantime.
+def write(app, key, compressed_data):
+  if PACK_STORAGE:
+    segment = pack_storage.append(app, key, compressed_data)
+    if not segment:
+      return []
+    # The index is committed with synchronous=NORMAL, so only syncing its
+    # write-ahead log makes the new row durable.
+    return [segment, pack_storage.get_pack_dir(app) + "index.sqlite-wal"]
+
+  # Save the data to a compressed file.  nginx serves it with gzip_static.
+  # Write a temporary file and link it into place, so that a partial file is
+  # never visible and an existing file is never overwritten.
+  file_name = cgi_utils.make_path(app, "storage", key, ".blockly.gz")
+  temp_name = "%s.%d.tmp" % (file_name, os.getpid())
+  with open(temp_name, "wb") as f:
+    f.write(compressed_data)
+  try:
+    os.link(temp_name, file_name)
+    return [file_name]
+  except FileExistsError:
+    return []
+  finally:
+    os.remove(temp_name)
+
+
+# Return the hash of the program stored under a key, or None if it is free.
+def stored_hash(app, key):
+  data = load(app, key)
+  if data is None:
+    return None
+  return hashlib.sha256(data).hexdigest()
+
+
+# Store a program and return its key.  In journal mode, any other 'records'
+# (dicts) are journaled along with it, with its key filled in.
+def store(app, data, records=()):
   # Add a poison line to prevent raw content from being served.
   data = POISON + data
 
   # Hash the content and generate a key.
   binary_data = data.encode("UTF-8")
   hash = hashlib.sha256(binary_data).hexdigest()
-  key = keyGen(hash)
-
-  # Save the data to a file.
-  file_name = cgi_utils.get_dir(app, "storage") + key + ".blockly"
-  with open(file_name, "w") as f:
-    f.write(data)
-  return key
-
-
-if __name__ == "__main__":
-  forms = cgi_utils.parse_post()
+  compressed_data = None
+
+  # On a collision with a different program, try the next key derived from
+  # the same hash.  If the key already holds this program, only touch it.
+  for attempt in range(MAX_ATTEMPTS):
+    key = keyGen(hash if attempt == 0 else "%s-%d" % (hash, attempt))
+    others = [dict(record, key=key) for record in records]
+    existing = load(app, key)
+    if existing == binary_data:
+      touch(app, key)
+      if others:
+        journal.append(others)
+      return key
+    if existing is None:
+      if JOURNAL:
+        # Reserve the key against programs still in the journal, too.
+        program = {"kind": "program", "app": app, "key": key, "data": data}
+        holder = journal.append([program] + others, "%s/%s" % (app, key),
+                                hash, lambda: stored_hash(app, key))
+        if holder is None:
+          return key
+        if holder == hash:
+          # This program is already on its way.
+          if others:
+            journal.append(others)
+          return key
+        continue
+      if compressed_data is None:
+        compressed_data = gzip.compress(binary_data, mtime=0)
+      if write(app, key, compressed_data):
+        return key
+      # Another request just took this key.  Check what it wrote.
+      if load(app, key) == binary_data:
+        return key
+  raise Exception("No free key for %s" % hash)
+
+
+def main():
+  print("Content-Type: text/plain")
+  try:
+    forms = cgi_utils.parse_post(limits={"data": MAX_DATA})
+  except cgi_utils.PayloadTooLarge as e:
+    print("Status: 413 Payload Too Large\n")
+    print(e)
+    return
   cgi_utils.force_exist(forms, "app", "data")
   app = forms["app"] or ""
   data = forms["data"]
 
-  print("Content-Type: text/plain")
   if check(app, data):
     key = store(app, data)
     print("Status: 200 OK\n")
     print(key)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Blockly Games: Storage Loader
+
+Copyright 2026 Google LLC
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""Fetch a stored program.
+Only needed with the pack storage backend, where nginx routes
+/data/<app>/storage/<key>.blockly here.  Programs that are still stored as
+individual files are read from those.
+"""
+
+__author__ = "blocklygames@neil.fraser.name (Neil Fraser)"
+
+import cgi_utils
+import gzip
+import pack_storage
+import re
+import storage
+
+# Called with two arguments:
+# - app: maze/bird/turtle/...
+# - key: Name of program.
+
+
+def main():
+  forms = cgi_utils.parse_query()
+  cgi_utils.force_exist(forms, "app", "key")
+  app = forms["app"] or ""
+  key = forms["key"] or ""
+
+  print("Content-Type: text/plain; charset=utf-8")
+  if not re.fullmatch(r"[-\w]+", app):
+    # Don't read "../../etc/passwd"
+    print("Status: 406 Not Acceptable\n")
+    print("That is not a valid directory.")
+    return
+  if not re.fullmatch(r"\w+", key):
+    # Don't escape from this directory.
+    print("Status: 406 Not Acceptable\n")
+    print("That is not a valid key.")
+    return
+
+  data = pack_storage.fetch(app, key)
+  if data is not None:
+    data = gzip.decompress(data)
+  else:
+    data = storage.load(app, key)
+  if data is None:
+    print("Status: 404 Not Found\n")
+    print("Program not found.")
+    return
+  print("Status: 200 OK\n")
+  print(data.decode("utf-8"), end="")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""Blockly Games: Thumbnail Optimizer
+
+Copyright 2026 Google LLC
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+"""Write smaller variants of gallery thumbnails, off the request path.
+gallery_submit.py saves each thumbnail exactly as the client sent it.  This
+worker finds thumbnails the index hasn't seen optimized, then writes next to
+each original:
+  <key>.grid.png  - Losslessly recompressed, and scaled down to the gallery
+                    grid if the client sent anything larger.
+  <key>.grid.webp - Lossless WebP.
+A variant is only kept if it is smaller than the one before it, except that a
+WebP always has a .grid.png beside it.  The index records the best PNG, which
+gallery_view.py then links to; nginx serves the WebP in its place to browsers
+that accept WebP.  Images are handled by Pillow; without it, thumbnails are
+only marked as seen.  The worker also builds the sprite sheets of the static
+gallery pages (see gallery_pages.py), including any that requests asked for.
+Run once, or keep running as a service with --watch:
+  python thumbnails.py [--workers N] [--watch SECONDS] [app ...]
+"""
+
+__author__ = "blocklygames@neil.fraser.name (Neil Fraser)"
+
+import argparse
+import cgi_utils
+import gallery_index
+import gallery_pages
+import gallery_sprites
+import io
+import multiprocessing
+import os
+import sys
+import time
+
+try:
+  from PIL import Image
+except ImportError:
+  # Thumbnails are only optimized if Pillow is installed.
+  Image = None
+
+
+# Size of the thumbnail canvas, and of the gallery grid.
+GRID_SIZE = 200
+# Number of thumbnails handed to the worker pool at once.
+BATCH_SIZE = 100
+# Refuse to decode anything larger than this.
+MAX_PIXELS = 2000 * 2000
+
+
+# Encode an image, returning the bytes.
+def encode(image, format, **options):
+  f = io.BytesIO()
+  image.save(f, format, **options)
+  return f.getvalue()
+
+
+# Write a variant atomically, since nginx may be serving it.
+def write_variant(app, key, variant, data):
+  file_name = cgi_utils.make_path(app, "gallery", key, variant)
+  temp_name = "%s.%d.tmp" % (file_name, os.getpid())
+  with open(temp_name, "wb") as f:
+    f.write(data)
+  os.replace(temp_name, file_name)
+
+
+# Write the variants of one thumbnail.  Returns (key, best PNG variant),
+# where the best variant is ".png" if nothing beat the original.
+def optimize(args):
+  (app, key) = args
+  if not Image:
+    return (key, ".png")
+  try:
+    with open(cgi_utils.find_path(app, "gallery", key, ".png"), "rb") as f:
+      original = f.read()
+    image = Image.open(io.BytesIO(original), formats=["PNG"])
+    if image.width * image.height > MAX_PIXELS:
+      raise ValueError("Image is too large")
+    image.load()
+  except (OSError, ValueError) as e:
+    print("%s/%s: %s" % (app, key, e), file=sys.stderr)
+    return (key, ".png")
+  if max(image.size) > GRID_SIZE:
+    # Average blocks of pixels, weighting colours by alpha so that
+    # transparent pixels don't darken edges.
+    scale = max(image.size) / GRID_SIZE
+    size = (max(1, round(image.width / scale)),
+            max(1, round(image.height / scale)))
+    image = image.convert("RGBa").resize(size, Image.BOX).convert("RGBA")
+    # The original is too large to show in the grid at all.
+    size = float("inf")
+  else:
+    size = len(original)
+  best = ".png"
+  data = encode(image, "PNG", optimize=True)
+  if len(data) < size:
+    (best, size) = (".grid.png", len(data))
+  else:
+    data = original
+  try:
+    webp = encode(image, "WEBP", lossless=True, quality=100, method=6)
+  except (KeyError, OSError):
+    # This Pillow was built without WebP.
+    webp = None
+  if webp and len(webp) < size:
+    write_variant(app, key, ".grid.webp", webp)
+    # nginx only swaps in the WebP for a .grid.png, which is also the
+    # fallback for browsers without WebP.
+    best = ".grid.png"
+  if best == ".grid.png":
+    write_variant(app, key, ".grid.png", data)
+  return (key, best)
+
+
+# Optimize up to one batch of an app's new thumbnails, and build any sprite
+# sheets that requests asked for.
+# Returns the number of thumbnails processed.
+def process(app, pool):
+  if gallery_sprites.take_request(app):
+    gallery_pages.materialize(app, build=True)
+  keys = gallery_index.unoptimized(app, BATCH_SIZE)
+  if not keys:
+    return 0
+  thumbs = dict(pool.imap_unordered(optimize, [(app, key) for key in keys]))
+  created = gallery_index.set_thumbs(app, thumbs)
+  gallery_pages.materialize(app, created, build=True)
+  return len(thumbs)
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Optimize gallery thumbnails.")
+  parser.add_argument("--workers", type=int, default=os.cpu_count() or 4,
+                      help="Number of worker processes.")
+  parser.add_argument("--watch", type=float, metavar="SECONDS",
+                      help="Keep checking for new thumbnails at this interval.")
+  parser.add_argument("apps", nargs="*", help="Apps to process (default: all).")
+  args = parser.parse_args()
+  with multiprocessing.Pool(args.workers) as pool:
+    while True:
+      done = 0
+      for app in args.apps or cgi_utils.get_apps("gallery"):
+        count = process(app, pool)
+        if count:
+          print("%s: optimized %d thumbnail(s)." % (app, count))
+          sys.stdout.flush()
+        done += count
+      if args.watch is None and not done:
+        break
+      if not done:
+        time.sleep(args.watch)